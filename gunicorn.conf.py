@@ -0,0 +1,9 @@
+# Loaded automatically by gunicorn from the working directory (see Procfile)
+
+# Build the in-process catalog index (see main_app/catalog.py) before the worker serves its first request
+def post_worker_init(worker):
+  from main_app.catalog import warm_catalog_index
+  try:
+    warm_catalog_index()
+  except Exception:
+    worker.log.exception('Could not warm the catalog index, it will be built on first use')
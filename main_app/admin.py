@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Cart, Tire, CartDetail, OrderShipping, Tread, Image, Product, Stock
+from .models import Cart, Tire, CartDetail, OrderShipping, Tread, Image, Product, Stock, OutboxEmail, AdminNotification
+from .managers import attach_latest_tire_names
+from .outbox import OutboxBatchAdminMixin
 from django.db import IntegrityError
 from django.http import HttpResponseRedirect
 from django.contrib import messages
@@ -9,7 +11,7 @@ from django.utils.html import format_html
 from django.forms.models import BaseInlineFormSet
 import datetime
 from copy import deepcopy
-from django.db.models import Q, F
+from django.db.models import Q, F, Prefetch
 import os
 import environ
 from django.db.models import Case, When, DecimalField
@@ -166,7 +168,7 @@ class ImageInline(admin.StackedInline):
 
 # ────────────────────────────────────────────────────────────────────────────────
 
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(OutboxBatchAdminMixin, admin.ModelAdmin):
   list_display = (
     'id',
     'get_order_number',
@@ -283,6 +285,11 @@ class CartAdmin(admin.ModelAdmin):
         'closed_at',
       )
 
+  # The money columns are annotated (and sortable) instead of being computed with a few queries per row
+  def get_queryset(self, request):
+    qs = super().get_queryset(request)
+    return qs.select_related('user', 'ordershipping').with_pricing()
+
   # Dynamic inlines
   def get_inlines(self, request, obj):
     if obj is None: # Add view
@@ -294,6 +301,7 @@ class CartAdmin(admin.ModelAdmin):
     'mark_as_fulfilled',
   ] 
 
+  # The shipping confirmations queued by send_order_fulfilled_email are sent together once the action is done (see OutboxBatchAdminMixin)
   def mark_as_fulfilled(self, req, queryset):
     updated = 0
     for cart in queryset:
@@ -363,6 +371,7 @@ class CartAdmin(admin.ModelAdmin):
   def get_total(self, obj):
     return format_html("<b style='color: red'>{}</b>", obj.get_total())
   get_total.short_description = format_html("<b style='color: red';>{}</b>", 'Total ($)')
+  get_total.admin_order_field = 'pricing_total'
 
 
 # ────────────────────────────────────────────────────────────────────────────────
@@ -403,16 +412,20 @@ class TireAdmin(admin.ModelAdmin):
 
   search_fields = (
     'product__id',
-    'brand',
     'year',
     'width',
     'aspect_ratio',
     'rim_size',
-    'load_speed',
-    'pattern',
-    'tread__name',
   )
 
+  # Brand, pattern, type, load/speed and tread are matched by the typo-tolerant search instead (see search.py)
+  def get_search_results(self, request, queryset, search_term):
+    matches = queryset.filter(pk__in=Tire.objects.search(search_term).values('pk'))
+    queryset, use_distinct = super().get_search_results(request, queryset, search_term)
+    if search_term:
+      queryset |= matches
+    return queryset, use_distinct
+
   # Dynamic fieldsets
   def get_fieldsets(self, request, obj=None):
     if obj: # Change view
@@ -823,9 +836,9 @@ class ProductAdmin(admin.ModelAdmin):
     'pattern',
     'tread',
     'load_speed',
-    # 'sold_quantity',
+    'sold_quantity',
     # 'decrease_quantity',
-    # 'current_quantity',
+    'current_quantity',
   )
 
   list_display_links = (
@@ -839,17 +852,20 @@ class ProductAdmin(admin.ModelAdmin):
 
   search_fields = (
     'id',
-    'tire__brand',
-    'tire__year',
-    'tire__width',
-    'tire__aspect_ratio',
-    'tire__rim_size',
-    'tire__tire_type',
-    'tire__pattern',
-    'tire__tread__name',
-    'tire__load_speed',
+    'current_tire__year',
+    'current_tire__width',
+    'current_tire__aspect_ratio',
+    'current_tire__rim_size',
   )
 
+  # Brand, pattern, type, load/speed and tread are matched by the typo-tolerant search instead (see search.py)
+  def get_search_results(self, request, queryset, search_term):
+    matches = queryset.filter(current_tire__in=Tire.objects.search(search_term).values('pk'))
+    queryset, use_distinct = super().get_search_results(request, queryset, search_term)
+    if search_term:
+      queryset |= matches
+    return queryset, use_distinct
+
   readonly_fields = (
     'id',
     'name',
@@ -896,16 +912,27 @@ class ProductAdmin(admin.ModelAdmin):
 
   inlines = (StockInline, TireInline)
 
+  # The current Tire version is joined through the materialized current_tire pointer and the stock figures are annotated
+  # in the same query (see ProductQuerySet.with_inventory), so sorting on them no longer needs a join across every version
+  # Products without a Tire version in effect yet (only future-dated versions, or none) aren't listed, as before
   def get_queryset(self, request):
     qs = super(ProductAdmin, self).get_queryset(request)
-    return qs.filter( # Need this filter so to remove duplicate rows when sorting on calculated fields)
-      (Q(tire__updated_to=None) & Q(tire__date_effective__lte=timezone.now())) | 
-      (Q(tire__updated_to__updated_to=None) & Q(tire__updated_to__date_effective__gte=timezone.now()))
-      )
+    return qs.filter(current_tire__isnull=False).with_inventory().with_latest_tire_id().select_related('current_tire__tread').prefetch_related(
+      Prefetch('current_tire__tread__image_set', queryset=Image.objects.order_by('id')),
+    )
+
+  # Resolves the names of every product on the page at once
+  def get_changelist_instance(self, request):
+    changelist = super().get_changelist_instance(request)
+    attach_latest_tire_names(changelist.result_list)
+    return changelist
 
   def get_image_display(self, obj):
-    if obj.get_current().tread:
-      return obj.get_current().tread.image_set.first().get_image_display()
+    current = obj.get_current()
+    if current and current.tread:
+      images = current.tread.image_set.all() # Prefetched
+      if images:
+        return images[0].get_image_display()
     return format_html("<img style='border: 1px solid lightgray; border-radius: 8px' width={width} height={height}/>".format(
         width = 100, # hardcoded thumbnail dimensions
         height = 100,
@@ -990,12 +1017,112 @@ class StockAdmin(admin.ModelAdmin):
 
 # ────────────────────────────────────────────────────────────────────────────────
 
+# Read-only view of the emails queued for the send_outbox_emails worker (see outbox.py)
+class OutboxEmailAdmin(admin.ModelAdmin):
+  list_display = (
+    'subject',
+    'get_recipients',
+    'status',
+    'attempts',
+    'next_attempt_at',
+    'sent_at',
+    'created_at',
+  )
+
+  list_filter = (
+    'status',
+    'to_admins',
+    'created_at',
+  )
+
+  search_fields = (
+    'subject',
+    'recipients',
+  )
+
+  readonly_fields = (
+    'to_admins',
+    'recipients',
+    'from_email',
+    'subject',
+    'body',
+    'html_body',
+    'attach_logo',
+    'status',
+    'attempts',
+    'next_attempt_at',
+    'last_error',
+    'sent_at',
+    'created_at',
+    'updated_at',
+  )
+
+  actions = [
+    'retry',
+  ]
+
+  def get_recipients(self, obj):
+    return 'Admins' if obj.to_admins else ', '.join(obj.recipient_list)
+  get_recipients.short_description = 'To'
+
+  def has_add_permission(self, request):
+    return False
+
+  # Puts failed (dead letter) emails back in the queue, to be sent on the next run of the worker
+  def retry(self, req, queryset):
+    updated = queryset.exclude(status=OutboxEmail.Status.SENT).update(status=OutboxEmail.Status.PENDING, attempts=0, next_attempt_at=timezone.now())
+    self.message_user(req, ngettext(
+      "%d email was queued to be sent again.",
+      "%d emails were queued to be sent again.",
+      updated,
+    ) % updated, messages.SUCCESS)
+  retry.short_description = 'Retry sending the selected emails'
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Read-only view of the events sent to the admins in digests (see notifications.py)
+class AdminNotificationAdmin(admin.ModelAdmin):
+  list_display = (
+    'subject',
+    'event',
+    'created_at',
+    'digested_at',
+  )
+
+  list_filter = (
+    'event',
+    'created_at',
+  )
+
+  search_fields = (
+    'subject',
+    'message',
+  )
+
+  readonly_fields = (
+    'event',
+    'subject',
+    'message',
+    'link',
+    'digest',
+    'digested_at',
+    'created_at',
+    'updated_at',
+  )
+
+  def has_add_permission(self, request):
+    return False
+
+# ────────────────────────────────────────────────────────────────────────────────
+
 # Register your models here
 admin.site.register(Cart, CartAdmin)
 admin.site.register(OrderShipping, OrderShippingAdmin)
 admin.site.register(Tread, TreadAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Stock, StockAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
+admin.site.register(AdminNotification, AdminNotificationAdmin)
 
 # Hide these models in production
 if os.environ['DEBUG_VALUE'] == 'True':
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import operator
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from .sizes import format_size
+from .search import SEARCH_FIELDS, match_values, search_terms
+
+"""
+In-process inverted index of the sellable catalog (the most recent Tire versions, ie. updated_to=None)
+
+The catalog is small and changes rarely, so each worker keeps it in memory to filter and sort tire_list searches
+without going to the database (only the 20 tires of the page are then fetched):
+  postings: size_* column -> value -> sorted array of tire ids (eg. 'size_width' -> 215 -> array('l', [3, 8, 12]))
+  texts: search_document, brand and tire_type -> value -> sorted array of tire ids, for the typo-tolerant search (see search.py)
+  orderings: sort key -> tuple of tire ids in that order, rebuilt lazily after a change
+  sizes: sorted (digits, size, count) of the distinct sizes, for the quick search typeahead, rebuilt lazily after a change
+
+The index has its own version, a counter bumped only when tires change (not the stock), which records the products that
+changed at each version in the shared cache (see CatalogChanges and signals.py). The index remembers the version it is at
+and refreshes the products changed since on its next use, including the changes made by other workers
+
+The catalog generation is a counter bumped whenever the catalog changes (tires or stock, see signals.py), results computed
+from the catalog are cached under keys that include it (eg. facets.py, result_cache.py), so a change makes them
+unreachable instead of having to find and delete them. It is kept in the database (see CatalogCounter), so that every
+worker sees it
+"""
+
+INDEXED_FIELDS = ('size_width', 'size_aspect_ratio', 'size_rim_diameter', 'size_service_type', 'size_overall_diameter')
+
+# Range operators answered by checking each distinct value of the column
+RANGE_OPERATORS = {
+  'gt': operator.gt,
+  'gte': operator.ge,
+  'lt': operator.lt,
+  'lte': operator.le,
+}
+
+# The sorts offered by tire_list (see tire_list.html), ties are broken by id
+# Same (value, id) keys as pagination.KeysetPaginator, where tires without a parsed width sort as 0
+SORT_KEYS = {
+  'price': lambda entry: (entry.price, entry.id),
+  'width': lambda entry: (entry.size_width or Decimal('0'), entry.id),
+}
+
+class CatalogEntry:
+  __slots__ = ('id', 'product_id', 'price', 'size_construction') + SEARCH_FIELDS + INDEXED_FIELDS
+
+  def __init__(self, **values):
+    for field, value in values.items():
+      setattr(self, field, value)
+
+def _add_id(ids, tire_id):
+  position = bisect_left(ids, tire_id)
+  if position == len(ids) or ids[position] != tire_id:
+    ids.insert(position, tire_id)
+
+def _remove_id(ids, tire_id):
+  position = bisect_left(ids, tire_id)
+  if position < len(ids) and ids[position] == tire_id:
+    del ids[position]
+
+class CatalogIndex:
+  def __init__(self, version=None):
+    self.version = version # Index version read before the tires were, see get_catalog_index()
+    self.entries = {}
+    self.product_tires = defaultdict(set)
+    self.postings = {field: defaultdict(lambda: array('l')) for field in INDEXED_FIELDS}
+    self.texts = {field: defaultdict(lambda: array('l')) for field in SEARCH_FIELDS}
+    self.orderings = {}
+    self.sizes = None
+    self.lock = threading.RLock() # For threaded workers, a refresh must not run while a search iterates the index
+
+  @classmethod
+  def build(cls, version=None):
+    index = cls(version)
+    for values in cls._current_tires():
+      index._add(values)
+    return index
+
+  @staticmethod
+  def _current_tires(**filters):
+    from .models import Tire # Avoid circular import, models.py imports search.py which this module imports
+    return Tire.objects.filter(updated_to=None, **filters).values('id', 'product_id', 'price', 'size_construction', *SEARCH_FIELDS, *INDEXED_FIELDS).iterator()
+
+  def _add(self, values):
+    entry = CatalogEntry(**values)
+    self.entries[entry.id] = entry
+    self.product_tires[entry.product_id].add(entry.id)
+    for field in INDEXED_FIELDS:
+      value = getattr(entry, field)
+      if value not in (None, ''):
+        _add_id(self.postings[field][value], entry.id)
+    for field in SEARCH_FIELDS:
+      _add_id(self.texts[field][getattr(entry, field)], entry.id)
+    self.orderings.clear()
+    self.sizes = None
+
+  def _remove(self, tire_id):
+    entry = self.entries.pop(tire_id)
+    self.product_tires[entry.product_id].discard(tire_id)
+    for field in INDEXED_FIELDS:
+      value = getattr(entry, field)
+      if value in self.postings[field]:
+        _remove_id(self.postings[field][value], tire_id)
+    for field in SEARCH_FIELDS:
+      _remove_id(self.texts[field][getattr(entry, field)], tire_id)
+    self.orderings.clear()
+    self.sizes = None
+
+  # Replaces the entries of a product with its current Tire versions (called after one of its Tires changed)
+  def refresh_product(self, product_id):
+    current_tires = list(self._current_tires(product_id=product_id))
+    with self.lock:
+      for tire_id in list(self.product_tires[product_id]):
+        self._remove(tire_id)
+      for values in current_tires:
+        self._add(values)
+
+  # Ids of the tires matching the size_* lookups (from sizes.py) and the search terms ({field: query}, see search.py),
+  # in the order of the sort
+  # Returns None for lookups the index can't answer (eg. width__icontains), the caller then uses the ORM instead
+  def search(self, lookups=None, terms=None, sort='price'):
+    key = sort.lstrip('-')
+    if key not in SORT_KEYS:
+      return None
+    with self.lock:
+      return self._search(lookups, search_terms(**(terms or {})), key, sort.startswith('-'))
+
+  def _search(self, lookups, terms, key, descending):
+    matches = None
+    for lookup, value in (lookups or {}).items():
+      ids = self._lookup(lookup, value)
+      if ids is None:
+        return None
+      matches = ids if matches is None else matches & ids
+    for field, query in terms.items():
+      ids = self._text_matches(field, query)
+      matches = ids if matches is None else matches & ids
+    ordering = self._ordering(key)
+    if descending:
+      ordering = ordering[::-1]
+    if matches is None:
+      return list(ordering)
+    return [tire_id for tire_id in ordering if tire_id in matches]
+
+  # (value, id) sort keys of the ids returned by search(), in ascending order (see pagination.SequenceKeysetPaginator)
+  def sort_keys(self, ids, sort):
+    with self.lock:
+      keys = [SORT_KEYS[sort.lstrip('-')](self.entries[tire_id]) for tire_id in ids if tire_id in self.entries]
+    return keys[::-1] if sort.startswith('-') else keys
+
+  # Distinct sizes of the catalog starting with the digits typed so far (eg. '215/5' -> 215/55R17, 215/60R16, ...)
+  # as [(size, number of tires), ...], answered with a binary search in the sorted size keys
+  def suggest_sizes(self, query, limit=10):
+    prefix = re.sub(r'\D', '', query or '')
+    with self.lock:
+      if self.sizes is None:
+        self.sizes = self._size_keys()
+      sizes = self.sizes
+    position = bisect_left(sizes, (prefix,))
+    suggestions = []
+    for key, size, count in sizes[position:]:
+      if not key.startswith(prefix) or len(suggestions) == limit:
+        break
+      suggestions.append((size, count))
+    return suggestions
+
+  # Sorted (digits, size, number of tires) of every distinct size, eg. ('2155517', '215/55R17', 4)
+  def _size_keys(self):
+    counts = Counter(
+      format_size(entry.size_service_type, entry.size_width, entry.size_aspect_ratio, entry.size_rim_diameter, entry.size_construction)
+      for entry in self.entries.values() if entry.size_width is not None
+    )
+    return sorted((re.sub(r'\D', '', size), size, count) for size, count in counts.items())
+
+  def _lookup(self, lookup, value):
+    field, _, operator_name = lookup.partition('__')
+    if field not in self.postings:
+      return None
+    postings = self.postings[field]
+    if not operator_name:
+      return set(postings.get(value, ()))
+    if operator_name in RANGE_OPERATORS:
+      # Ranges come in pairs (see sizes.quick_search_lookups and sizes.equivalent_lookups), each half is checked against every distinct value
+      check = RANGE_OPERATORS[operator_name]
+      return {tire_id for candidate, ids in postings.items() if check(candidate, value) for tire_id in ids}
+    return None
+
+  # Same matching as search.search_tires(), evaluated once per distinct value of the field
+  def _text_matches(self, field, query):
+    values = self.texts[field]
+    return {tire_id for value in match_values(query, values) for tire_id in values[value]}
+
+  def _ordering(self, key):
+    if key not in self.orderings:
+      self.orderings[key] = tuple(entry.id for entry in sorted(self.entries.values(), key=SORT_KEYS[key]))
+    return self.orderings[key]
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+_index = None
+_lock = threading.Lock()
+
+# How long the products changed at each index version are kept, a worker further behind than that rebuilds its index
+INDEX_CHANGE_TIMEOUT = 60 * 60
+
+def _index_change_key(version):
+  return f'catalog:index_change:{version}'
+
+# The index of this process at the current index version, built on first use (or warmed at worker start, see
+# gunicorn.conf.py), then brought up to date by refreshing the products changed since (see CatalogChanges)
+# It is only rebuilt when those changes aren't known anymore (eg. a worker idle for more than INDEX_CHANGE_TIMEOUT)
+# The version is read before the tires are, and bumped once a change is committed, so the index has every change up to it
+def get_catalog_index():
+  global _index
+  version = get_catalog_counter(CATALOG_INDEX_VERSION)
+  with _lock:
+    if _index is None:
+      _index = CatalogIndex.build(version)
+    elif _index.version < version:
+      changes = catalog_cache().get_many([_index_change_key(change) for change in range(_index.version + 1, version + 1)])
+      if len(changes) < version - _index.version:
+        _index = CatalogIndex.build(version)
+      else:
+        for product_id in {product_id for product_ids in changes.values() for product_id in product_ids}:
+          _index.refresh_product(product_id)
+        _index.version = version
+    return _index
+
+def warm_catalog_index():
+  get_catalog_index()
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+CATALOG_GENERATION = 'generation'
+CATALOG_INDEX_VERSION = 'index'
+
+# Cache shared by every worker (see CACHES in settings.py), so that they all reuse each other's results
+def catalog_cache():
+  return caches['shared'] if 'shared' in settings.CACHES else caches['default']
+
+# The counters are rows of CatalogCounter, so that every worker agrees on them and an increment is never lost (the
+# shared cache only has a get-then-set incr())
+# A missing counter starts from the current time, so it never goes back to a generation that results may still be cached under
+def get_catalog_counter(name):
+  from .models import CatalogCounter # Avoid circular import, models.py imports this module
+  value = CatalogCounter.objects.filter(name=name).values_list('value', flat=True).first()
+  if value is None:
+    value = CatalogCounter.objects.get_or_create(name=name, defaults={'value': int(time.time())})[0].value
+  return value
+
+def bump_catalog_counter(name):
+  from .models import CatalogCounter # Avoid circular import, models.py imports this module
+  with transaction.atomic():
+    if not CatalogCounter.objects.filter(name=name).update(value=F('value') + 1):
+      CatalogCounter.objects.get_or_create(name=name, defaults={'value': int(time.time())})
+    return CatalogCounter.objects.get(name=name).value
+
+def get_catalog_generation():
+  return get_catalog_counter(CATALOG_GENERATION)
+
+def bump_catalog_generation():
+  return bump_catalog_counter(CATALOG_GENERATION)
+
+# What a transaction changed in the catalog, applied once it is committed: the index version is bumped if tires changed
+# (recording which products), then the generation
+# The index version is bumped first, so a worker that sees the new generation also sees the index version with the change
+class CatalogChanges:
+  def __init__(self):
+    self.product_ids = set()
+
+  def __call__(self):
+    if self.product_ids:
+      version = bump_catalog_counter(CATALOG_INDEX_VERSION)
+      catalog_cache().set(_index_change_key(version), sorted(self.product_ids), INDEX_CHANGE_TIMEOUT)
+    bump_catalog_generation()
+
+# The changes of the current transaction, a single CatalogChanges however many tires or stock rows it changes
+def _catalog_changes(using=None):
+  connection = transaction.get_connection(using)
+  for savepoint_ids, func in connection.run_on_commit:
+    if isinstance(func, CatalogChanges):
+      return func
+  changes = CatalogChanges()
+  transaction.on_commit(changes, using)
+  return changes
+
+# Bumps the generation once the current transaction is committed (right away outside of a transaction)
+def bump_catalog_generation_on_commit(using=None):
+  _catalog_changes(using)
+
+# Refreshes the products in the catalog index of every worker once the current transaction is committed (after one of
+# their Tires changed), and bumps the generation
+def refresh_catalog_products_on_commit(product_ids, using=None):
+  if transaction.get_connection(using).in_atomic_block:
+    _catalog_changes(using).product_ids.update(product_ids)
+  else:
+    changes = CatalogChanges()
+    changes.product_ids.update(product_ids)
+    changes()
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+LOCAL_CATALOG_CACHE_TIMEOUT = 5 * 60
+
+# Value cached under a key that includes the catalog generation, looked up in the cache of this worker first, then in the
+# shared one (so that a value computed by one worker is reused by the others)
+def get_cached(key, timeout=CATALOG_CACHE_TIMEOUT):
+  local, shared = caches['default'], catalog_cache()
+  value = local.get(key)
+  if value is None and shared is not local:
+    value = shared.get(key)
+    if value is not None:
+      local.set(key, value, min(timeout, LOCAL_CATALOG_CACHE_TIMEOUT))
+  return value
+
+def set_cached(key, value, timeout=CATALOG_CACHE_TIMEOUT):
+  local, shared = caches['default'], catalog_cache()
+  local.set(key, value, min(timeout, LOCAL_CATALOG_CACHE_TIMEOUT))
+  if shared is not local:
+    shared.set(key, value, timeout)
+
+# Digest of the size_* lookups (from sizes.py) and terms of a search, the same for every way of writing it
+# (eg. '215/55R17' and '2155517' give the same lookups)
+def search_key(lookups, terms=None):
+  search = json.dumps([sorted((lookup, str(value)) for lookup, value in lookups.items()), sorted(search_terms(**(terms or {})).items())])
+  return hashlib.md5(search.encode()).hexdigest()
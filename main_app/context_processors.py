@@ -0,0 +1,47 @@
+from collections import namedtuple
+from django.core.cache import caches
+from django.db.models import Count, F
+from django.utils.functional import SimpleLazyObject
+from .models import Cart
+
+"""
+Template context shared by every page
+
+cart_badge is the current cart of the signed in user (its id and number of items, for the cart icon of base.html),
+cached per user so that page views don't query the carts
+The entry is in the cache of each web process, under a key that includes CustomUser.cart_badge_version, which is loaded
+with request.user anyway: a page view whose badge is cached doesn't make any query for it
+The Cart and CartDetail signal handlers increment the version in the same transaction as the change to the user's carts
+(see signals.py), including from the admin, so every process computes the badge again once the change is committed
+"""
+
+CART_BADGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+CartBadge = namedtuple('CartBadge', ['id', 'item_count'])
+
+def cart_badge_key(user):
+  return f'cart_badge:{user.id}:{user.cart_badge_version}'
+
+# The most recent current cart, like tire_detail and add_to_cart, in a single query
+def get_cart_badge(user):
+  cache = caches['default']
+  key = cart_badge_key(user)
+  badge = cache.get(key)
+  if badge is None:
+    cart = Cart.objects.filter(user_id=user.id, status=Cart.Status.CURRENT).annotate(badge_item_count=Count('cartdetail')).order_by('ordered_at').values_list('id', 'badge_item_count').last()
+    badge = CartBadge(*(cart or (None, 0)))
+    cache.set(key, tuple(badge), CART_BADGE_CACHE_TIMEOUT)
+  return CartBadge(*badge)
+
+# Incremented with F() so that concurrent changes don't overwrite each other, and committed with the change: other requests
+# only load the new version once the carts they would count have it
+def invalidate_cart_badge(user_id):
+  from users.models import CustomUser # Avoid circular import, users/models.py imports main_app.models which this module imports
+  CustomUser.objects.filter(pk=user_id).update(cart_badge_version=F('cart_badge_version') + 1)
+
+# Looked up when a template uses it (so not by the admin pages)
+def cart_badge(request):
+  def badge():
+    user = request.user
+    return get_cart_badge(user) if user.is_authenticated else CartBadge(None, 0)
+  return {'cart_badge': SimpleLazyObject(badge)}
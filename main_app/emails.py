@@ -0,0 +1,69 @@
+import functools
+import os
+from email.mime.image import MIMEImage
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
+from .managers import attach_relevant_tires
+from .models import OrderShipping
+
+"""
+Composition of the order emails
+
+The templates are compiled and the logo is read from disk once per process, instead of on every email
+An email is rendered from an order context fetched up front with order_context() (the order, its cart and user, and the
+items with their Tire versions), so rendering it doesn't query the database
+build_invoice_message() turns a context into a ready-to-send message, see the benchmark_emails command for its throughput
+"""
+
+INVOICE_TEMPLATE = 'email/invoice_email.html'
+ORDER_TEMPLATE = 'email/order_email.html'
+
+# Shown by the HTML emails with <img src="cid:static/images/road-star-logo.png">
+LOGO_CONTENT_ID = 'static/images/road-star-logo.png'
+LOGO_PATH = os.path.join(os.path.dirname(__file__), LOGO_CONTENT_ID)
+
+@functools.lru_cache(maxsize=None)
+def compiled_template(name):
+  return get_template(name)
+
+@functools.lru_cache(maxsize=None)
+def logo_bytes():
+  with open(LOGO_PATH, 'rb') as fp:
+    return fp.read()
+
+# A new part for every email, from the bytes read once: a part is changed by the message it is attached to (eg. its headers
+# when the message is serialized), so one instance can't be shared between emails
+def logo_image():
+  image = MIMEImage(logo_bytes())
+  image.add_header('Content-ID', f'<{LOGO_CONTENT_ID}>')
+  return image
+
+# Everything the order emails show, in 2 queries (the order with its cart and user, then the items with their Tire versions)
+# order is an OrderShipping or its id
+def order_context(order, user=None):
+  if not isinstance(order, OrderShipping):
+    order = OrderShipping.objects.select_related('cart__user').get(pk=order)
+  cart_details = attach_relevant_tires(order.cart.cartdetail_set.with_relevant_tire_id())
+  return {'order': order, 'user': user or order.cart.user, 'cart_details': cart_details}
+
+# (subject, message, html_message) of the email sent when an order is shipped
+def render_invoice_email(context):
+  order = context['order']
+  subject = f"Roadstar Tire Wholesale Order # {order.id} was shipped"
+  message = f"Your order has been shipped and an invoice will be provided on delivery. Please log into your account to view details."
+  return subject, message, compiled_template(INVOICE_TEMPLATE).render(context)
+
+# (subject, message, html_message) of the email sent when an order is placed
+def render_order_email(user, cart, cart_details):
+  subject = f"Roadstar Tire Wholesale Order # {cart.ordershipping.id} Summary"
+  message = f"Thank you for your business. Your order will be reviewed and shipped shortly. Here is a summary of your order below:"
+  return subject, message, compiled_template(ORDER_TEMPLATE).render({'user': user, 'cart': cart, 'cart_details': cart_details})
+
+def build_invoice_message(context, connection=None):
+  subject, message, html_message = render_invoice_email(context)
+  email = EmailMultiAlternatives(subject, message, settings.EMAIL_HOST_USER, [context['user'].email], connection=connection)
+  email.attach_alternative(html_message, 'text/html')
+  email.mixed_subtype = 'related'
+  email.attach(logo_image())
+  return email
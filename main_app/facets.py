@@ -0,0 +1,57 @@
+from collections import Counter
+from django.db.models import Count
+from .catalog import get_catalog_generation, get_cached, set_cached, search_key
+from .search import search_terms
+
+"""
+Facet counts of a tire search (number of matches per brand, type, rim size and tread)
+
+All the facets are counted with a single grouped query over the current Tire versions matching the search:
+one row per distinct (brand, tire_type, size_rim_diameter, tread) combination, which are then added up per facet
+The result is cached per normalized search and catalog generation (see catalog.py), so it is computed once per catalog change
+The generation is kept in the database and bumped once a change is committed, and the counts are cached in the cache shared
+by every worker (see catalog.get_cached): a worker never serves counts from before a change made by another one
+"""
+
+# (facet, field counted, label)
+FACETS = (
+  ('brand', 'brand', 'Brand'),
+  ('tire_type', 'tire_type', 'Type'),
+  ('rim_size', 'size_rim_diameter', 'Rim size'),
+  ('tread', 'tread__name', 'Tread'),
+)
+
+FACETS_CACHE_TIMEOUT = 60 * 60
+
+def _cache_key(generation, lookups, terms):
+  return f'facets:{generation}:{search_key(lookups, terms)}'
+
+# Rim diameters are listed as they are written on the tire (eg. 17 rather than 17.00)
+def _label(facet, value):
+  if facet == 'rim_size' and value is not None:
+    return f'{value.normalize():f}'
+  return value
+
+# [(label, [(value, count), ...]), ...] with values sorted by count, for the size_* lookups (from sizes.py) and terms
+# ({field: query}, see search.py) of the search
+# The generation is read before counting, so counts that may include a later change are at worst cached under the previous one
+def search_facets(lookups, terms=None):
+  key = _cache_key(get_catalog_generation(), lookups, terms)
+  facets = get_cached(key, FACETS_CACHE_TIMEOUT)
+  if facets is None:
+    facets = _count_facets(lookups, terms)
+    set_cached(key, facets, FACETS_CACHE_TIMEOUT)
+  return facets
+
+def _count_facets(lookups, terms):
+  from .models import Tire # Avoid circular import, models.py imports search.py which this module imports
+  tires = Tire.objects.filter(updated_to=None, **lookups)
+  terms = search_terms(**(terms or {}))
+  if terms:
+    tires = tires.search(**terms)
+  counters = {facet: Counter() for facet, field, label in FACETS}
+  for row in tires.order_by().values(*(field for facet, field, label in FACETS)).annotate(count=Count('id')):
+    for facet, field, label in FACETS:
+      if row[field] not in (None, ''):
+        counters[facet][_label(facet, row[field])] += row['count']
+  return [(label, sorted(counters[facet].items(), key=lambda item: (-item[1], str(item[0])))) for facet, field, label in FACETS]
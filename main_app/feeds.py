@@ -0,0 +1,58 @@
+import csv
+import json
+from decimal import Decimal
+from django.db.models import Exists, OuterRef, Q, Value, CharField
+from django.db.models.functions import Coalesce
+from .models import Tire
+from .sizes import format_size
+
+"""
+Price list feeds (every tire in effect, as CSV or NDJSON)
+
+The rows are read with a server-side cursor (QuerySet.iterator) and written out as they are read by a
+StreamingHttpResponse (see views.price_list), so memory use doesn't grow with the size of the catalog
+
+A tire is listed when it is the most recent version of its product whose date_effective has passed (same as
+Product.resolve_current, without waiting for promote_tires to move Product.current_tire)
+With since, only the tires that came into effect after it and the products whose stock band changed after it are listed
+"""
+
+PRICE_LIST_FIELDS = ('product_id', 'tire_id', 'size', 'brand', 'pattern', 'load_speed', 'tire_type', 'price', 'stock', 'date_effective')
+
+PRICE_LIST_CHUNK_SIZE = 2000
+
+def price_list_rows(now, since=None):
+  superseded = Tire.objects.filter(product=OuterRef('product'), id__gt=OuterRef('id'), date_effective__lte=now)
+  tires = Tire.objects.filter(date_effective__lte=now).with_relevant_price().annotate(
+    superseded=Exists(superseded),
+    stock_band=Coalesce('product__inventory__stock_band', Value('low'), output_field=CharField()),
+  ).filter(superseded=False)
+  if since is not None:
+    tires = tires.filter(Q(date_effective__gt=since) | Q(product__inventory__stock_band_changed_at__gt=since))
+  rows = tires.order_by('product_id').values_list(
+    'product_id', 'id', 'width', 'aspect_ratio', 'rim_size', 'size_service_type', 'size_width', 'size_aspect_ratio',
+    'size_rim_diameter', 'size_construction', 'brand', 'pattern', 'load_speed', 'tire_type', '_relevant_price', 'stock_band',
+    'date_effective',
+  )
+  for (product_id, tire_id, width, aspect_ratio, rim_size, service_type, size_width, size_aspect_ratio, size_rim_diameter,
+      construction, brand, pattern, load_speed, tire_type, price, stock_band, date_effective) in rows.iterator(chunk_size=PRICE_LIST_CHUNK_SIZE):
+    if size_width is None:
+      size = f'{width}/{aspect_ratio}{rim_size}'
+    else:
+      size = format_size(service_type, size_width, size_aspect_ratio, size_rim_diameter, construction)
+    yield (product_id, tire_id, size, brand, pattern, load_speed, tire_type, str(Decimal(price).quantize(Decimal('0.01'))), stock_band, date_effective.isoformat())
+
+# File-like object that returns what is written to it, so that csv.writer can produce the lines of a streaming response
+class Echo:
+  def write(self, value):
+    return value
+
+def csv_lines(rows):
+  writer = csv.writer(Echo())
+  yield writer.writerow(PRICE_LIST_FIELDS)
+  for row in rows:
+    yield writer.writerow(row)
+
+def ndjson_lines(rows):
+  for row in rows:
+    yield json.dumps(dict(zip(PRICE_LIST_FIELDS, row))) + '\n'
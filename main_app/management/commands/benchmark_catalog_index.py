@@ -0,0 +1,53 @@
+import time
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from main_app.catalog import CatalogIndex
+from main_app.models import Tire
+from main_app.sizes import quick_search_lookups, size_lookups
+
+# Compares the tire_list searches served by the in-process catalog index with the same searches through the ORM
+# Usage: python manage.py benchmark_catalog_index [--iterations 200]
+class Command(BaseCommand):
+  help = 'Times tire_list searches with the in-process catalog index against the ORM'
+
+  SEARCHES = (
+    ('all, by price', {}, {}, 'price'),
+    ('quick 215/55R17', quick_search_lookups('215/55R17'), {}, 'price'),
+    ('quick 22 (range), by -width', quick_search_lookups('22'), {}, '-width'),
+    ('rim 17 + brand', size_lookups('', '', '17'), {'brand': 'michelin'}, 'price'),
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--iterations', type=int, default=200)
+
+  def handle(self, *args, **options):
+    iterations = options['iterations']
+    started = time.perf_counter()
+    index = CatalogIndex.build()
+    self.stdout.write(f'Built the index of {len(index.entries)} tires in {(time.perf_counter() - started) * 1000:.1f} ms')
+    for label, lookups, terms, sort in self.SEARCHES:
+      orm = self.time(iterations, lambda: self.orm_page(lookups, terms, sort))
+      indexed = self.time(iterations, lambda: self.index_page(index, lookups, terms, sort))
+      self.stdout.write(f'{label:<30} ORM {orm:8.3f} ms   index {indexed:8.3f} ms   x{orm / indexed if indexed else 0:.1f}')
+
+  @staticmethod
+  def time(iterations, function):
+    started = time.perf_counter()
+    for _ in range(iterations):
+      function()
+    return (time.perf_counter() - started) * 1000 / iterations
+
+  # Same work as tire_list: count the matches and fetch the first page
+  @staticmethod
+  def orm_page(lookups, terms, sort):
+    results = Tire.objects.with_inventory().filter(updated_to=None, **lookups)
+    if terms:
+      results = results.search(**terms)
+    page = Paginator(results.order_by(sort.replace('width', 'size_width')), 20).get_page(1)
+    return list(page.object_list)
+
+  @staticmethod
+  def index_page(index, lookups, terms, sort):
+    page = Paginator(index.search(lookups, terms, sort), 20).get_page(1)
+    tires = Tire.objects.with_inventory().in_bulk(page.object_list)
+    return [tires[tire_id] for tire_id in page.object_list]
@@ -0,0 +1,164 @@
+import json
+import math
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import reverse
+from main_app.models import Cart, Image, OutboxEmail, Product, Tire, Tread
+from main_app.notifications import flush_admin_digest
+from main_app.outbox import deliver
+from main_app.smtp_sink import SMTPSink
+from users.models import CustomUser
+
+# Drives orders through every path that queues or sends emails, with the test client: signup, the verification of the account
+# (users.signals), cart_order, fulfilment from the admin (sent right away, see OutboxBatchAdminMixin), email_invoice and order_cancel
+# The emails are delivered to an in-process SMTP server on localhost (see smtp_sink.py), never to the real mail server,
+# then it reports the p50/p99 latency of each step and the emails delivered per second by the outbox
+# It runs against a throwaway test database (test_<NAME>, created and destroyed like the test runner does, so the database
+# user needs the permission to create databases), never the configured one: the orders it places lock rows and queue emails
+# With --max-p99 and/or --min-rate it fails when a threshold isn't met, to catch email slowdowns (eg. in CI)
+# Usage: python manage.py benchmark_email_throughput [--orders 50] [--batch-size 50] [--max-p99 <ms>] [--min-rate <emails/s>]
+class Command(BaseCommand):
+  help = 'Measures the latency of the requests that send emails and the outbox throughput, against a local SMTP sink'
+
+  PASSWORD = 'Benchmark-Passw0rd!'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--orders', type=int, default=50, help='Customers to sign up (each places an order that is fulfilled, and one that is cancelled)')
+    parser.add_argument('--batch-size', type=int, default=50, help='Emails sent per connection to the mail server')
+    parser.add_argument('--max-p99', type=float, help='Fail if the p99 latency of a step is above this (ms)')
+    parser.add_argument('--min-rate', type=float, help='Fail if the outbox delivers fewer emails per second')
+
+  def handle(self, *args, **options):
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+      latencies, sent_by_admin, sent, failed, elapsed, received = self.benchmark(options['orders'], options['batch_size'])
+    finally:
+      teardown_databases(old_config, verbosity=0)
+
+    self.stdout.write(f'{"step":<24} {"count":>6} {"p50 ms":>9} {"p99 ms":>9}')
+    for step, values in latencies.items():
+      self.stdout.write(f'{step:<24} {len(values):>6} {percentile(values, 50):9.2f} {percentile(values, 99):9.2f}')
+    rate = sent / elapsed if elapsed else 0
+    self.stdout.write(f'Outbox: {sent} emails delivered in {elapsed:.2f} s, {rate:.1f} emails/s ({failed} failed)')
+    self.stdout.write(f'Sent right away by the admin: {sent_by_admin}, received by the SMTP sink: {received}')
+
+    errors = []
+    if options['max_p99'] is not None:
+      errors += [
+        f'p99 of {step} is {percentile(values, 99):.2f} ms (max {options["max_p99"]} ms)'
+        for step, values in latencies.items() if percentile(values, 99) > options['max_p99']
+      ]
+    if options['min_rate'] is not None and rate < options['min_rate']:
+      errors.append(f'the outbox delivered {rate:.1f} emails/s (min {options["min_rate"]})')
+    if failed or received != sent_by_admin + sent:
+      errors.append(f'{failed} emails failed and {sent_by_admin + sent - received} were not received')
+    if errors:
+      raise CommandError('; '.join(errors))
+    self.stdout.write(self.style.SUCCESS('OK'))
+
+  # (latencies per step, emails sent by the admin, sent by the outbox, failed, seconds of the outbox, received by the sink)
+  # of the orders, in the current database (see handle())
+  def benchmark(self, orders, batch_size):
+    tire = self.create_tire()
+    with SMTPSink() as sink, override_settings(
+      EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+      EMAIL_HOST=sink.host,
+      EMAIL_PORT=sink.port,
+      EMAIL_USE_TLS=False,
+      EMAIL_USE_SSL=False,
+      EMAIL_HOST_USER='',
+      EMAIL_HOST_PASSWORD='',
+      ADMINS=[('Staff', 'staff@example.com')],
+      ALLOWED_HOSTS=['testserver'],
+    ):
+      latencies = self.drive_orders(tire, orders)
+      sent_by_admin = len(sink.messages)
+      sent, failed, elapsed = self.deliver_outbox(batch_size)
+    return latencies, sent_by_admin, sent, failed, elapsed, len(sink.messages)
+
+  # The test database starts empty
+  @staticmethod
+  def create_tire():
+    tread = Tread.objects.create(name='Benchmark')
+    Image.objects.create(tread=tread, url='https://example.com/benchmark.png')
+    return Tire.objects.create(
+      product=Product.objects.create(), tread=tread, brand='Benchmark', pattern='B1', width='215', aspect_ratio='55', rim_size='17',
+      tire_type='All Season', load_speed='94V', price=Decimal('100.00'),
+    )
+
+  def drive_orders(self, tire, orders):
+    latencies = defaultdict(list)
+    staff = Client()
+    staff.force_login(CustomUser.objects.create_superuser(f'benchmark-staff-{uuid.uuid4().hex[:8]}@example.com', self.PASSWORD))
+    for i in range(orders):
+      customer = Client()
+      email = f'benchmark-{uuid.uuid4().hex[:8]}-{i}@example.com'
+      self.timed(latencies['signup'], 'signup', lambda: customer.post(reverse('signup'), self.signup_data(email)))
+      user = CustomUser.objects.get(email=email)
+      user.is_active = True
+      self.timed(latencies['verification (save)'], None, user.save)
+      customer.force_login(user)
+
+      order = self.place_order(customer, user, tire, latencies)
+      self.timed(latencies['fulfilment (admin)'], 'mark_as_fulfilled', lambda: staff.post(
+        reverse('admin:main_app_cart_changelist'), {'action': 'mark_as_fulfilled', '_selected_action': [order.cart_id]}
+      ))
+      self.timed(latencies['email_invoice'], 'email_invoice', lambda: customer.get(reverse('email_invoice', args=[order.id])))
+
+      order = self.place_order(customer, user, tire, latencies)
+      self.timed(latencies['order_cancel'], 'order_cancel', lambda: customer.get(reverse('order_cancel', args=[order.id])))
+    return latencies
+
+  def place_order(self, customer, user, tire, latencies):
+    customer.post(reverse('add_to_cart'), json.dumps({'id': tire.id, 'quantity': 4}), content_type='application/json')
+    cart = Cart.objects.get(user=user, status=Cart.Status.CURRENT)
+    self.timed(latencies['cart_order'], 'cart_order', lambda: customer.get(reverse('cart_order', args=[cart.id])))
+    return Cart.objects.get(pk=cart.pk).ordershipping
+
+  # Same as the send_outbox_emails worker, for the emails queued by drive_orders and the digest of its admin notifications:
+  # (sent, failed, seconds)
+  @staticmethod
+  def deliver_outbox(batch_size):
+    started = time.perf_counter()
+    flush_admin_digest(force=True)
+    emails = list(OutboxEmail.objects.filter(status=OutboxEmail.Status.PENDING).order_by('id'))
+    sent = failed = 0
+    for start in range(0, len(emails), batch_size):
+      batch_sent, batch_failed = deliver(emails[start:start + batch_size])
+      sent, failed = sent + batch_sent, failed + len(batch_failed)
+    return sent, failed, time.perf_counter() - started
+
+  # The views answer with a redirect when they succeed
+  @staticmethod
+  def timed(latencies, name, request):
+    started = time.perf_counter()
+    response = request()
+    latencies.append((time.perf_counter() - started) * 1000)
+    if name and response.status_code != 302:
+      raise CommandError(f'{name} answered {response.status_code} instead of redirecting')
+
+  def signup_data(self, email):
+    return {
+      'first_name': 'Bench',
+      'last_name': 'Mark',
+      'email': email,
+      'company_name': 'Benchmark Tires',
+      'business_phone': '905-555-0100',
+      'address': '1 Benchmark Rd',
+      'city': 'Vaughan',
+      'province_iso': 'ON',
+      'postal_code': 'L4K 0A1',
+      'timezone': 'America/Toronto',
+      'password1': self.PASSWORD,
+      'password2': self.PASSWORD,
+    }
+
+# Nearest-rank percentile
+def percentile(values, percent):
+  values = sorted(values)
+  return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
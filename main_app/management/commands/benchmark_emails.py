@@ -0,0 +1,45 @@
+import time
+from email.mime.image import MIMEImage
+from django.core.mail import EmailMultiAlternatives
+from django.core.management.base import BaseCommand, CommandError
+from django.template import loader
+from main_app.emails import LOGO_CONTENT_ID, LOGO_PATH, INVOICE_TEMPLATE, build_invoice_message, order_context
+from main_app.models import OrderShipping
+
+# Measures how many invoice emails per second are rendered into ready-to-send messages (MIME bytes), from a prefetched
+# order context, with the precompiled template and cached logo (see emails.py) against rendering and reading them every time
+# Nothing is sent. Usage: python manage.py benchmark_emails [--count 500] [--order <OrderShipping id>]
+class Command(BaseCommand):
+  help = 'Times the composition of invoice emails (messages rendered per second)'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--order', type=int, help='OrderShipping id (the most recent order by default)')
+
+  def handle(self, *args, **options):
+    order_id = options['order'] or OrderShipping.objects.order_by('-id').values_list('id', flat=True).first()
+    if order_id is None:
+      raise CommandError('There are no orders to render')
+    context = order_context(order_id)
+    count = options['count']
+    for label, build in (('render every time', self.uncached_message), ('precompiled + cached logo', build_invoice_message)):
+      build(context).message().as_bytes() # Warm up (template loading, imports)
+      started = time.perf_counter()
+      for _ in range(count):
+        build(context).message().as_bytes()
+      elapsed = time.perf_counter() - started
+      self.stdout.write(f'{label:<28} {count / elapsed:10.1f} messages/s   {elapsed * 1000 / count:8.3f} ms/message')
+
+  # Same as the emails were built before emails.py
+  @staticmethod
+  def uncached_message(context):
+    order = context['order']
+    html_message = loader.render_to_string(INVOICE_TEMPLATE, context)
+    email = EmailMultiAlternatives(f"Roadstar Tire Wholesale Order # {order.id} was shipped", '', None, [context['user'].email])
+    email.attach_alternative(html_message, 'text/html')
+    email.mixed_subtype = 'related'
+    with open(LOGO_PATH, 'rb') as fp:
+      image = MIMEImage(fp.read())
+    image.add_header('Content-ID', f'<{LOGO_CONTENT_ID}>')
+    email.attach(image)
+    return email
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from main_app.models import Product
+
+# Advances Product.current_tire once a Tire version's date_effective has passed
+# The worker process already does it every few minutes (see send_outbox_emails), run it to promote right away: python manage.py promote_tires
+class Command(BaseCommand):
+  help = 'Points Product.current_tire at Tire versions whose date_effective has passed'
+
+  def handle(self, *args, **options):
+    promoted = Product.objects.promote_tires()
+    self.stdout.write(self.style.SUCCESS(f'Promoted the current Tire version of {promoted} products'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from main_app.models import ProductInventory
+
+# Recomputes the ProductInventory counters from the Stock ledger and the fulfilled carts
+# Usage: python manage.py rebuild_inventory
+class Command(BaseCommand):
+  help = 'Recomputes the denormalized inventory counters of every Product from the Stock ledger and fulfilled carts'
+
+  def handle(self, *args, **options):
+    count = ProductInventory.rebuild()
+    self.stdout.write(self.style.SUCCESS(f'Rebuilt inventory counters for {count} products'))
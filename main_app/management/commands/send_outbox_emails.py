@@ -0,0 +1,78 @@
+import select
+import time
+from django.core.management.base import BaseCommand
+from django.db import InterfaceError, OperationalError, connection
+from main_app.models import Product
+from main_app.notifications import flush_admin_digest
+from main_app.outbox import OUTBOX_CHANNEL, deliver_pending
+
+# Sends the emails queued in the outbox (see outbox.py), retrying the ones that failed
+# Also queues the digest of the admin notifications once it is due (see notifications.py), and promotes the Tire versions
+# whose date_effective has passed to Product.current_tire every --promote-interval seconds (see promote_tires)
+# Runs as the worker process (see Procfile): python manage.py send_outbox_emails
+# Or once, eg. from a scheduler: python manage.py send_outbox_emails --once
+class Command(BaseCommand):
+  help = 'Delivers the pending emails of the outbox, with retries and backoff'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--once', action='store_true', help='Deliver the emails that are due and exit')
+    parser.add_argument('--batch-size', type=int, default=50, help='Emails sent per connection to the mail server')
+    parser.add_argument('--interval', type=float, default=10, help='Seconds between checks for due emails (retries)')
+    parser.add_argument('--promote-interval', type=float, default=60, help='Seconds between promotions of the Tire versions coming into effect')
+
+  def handle(self, *args, **options):
+    if options['once']:
+      flush_admin_digest()
+      Product.objects.promote_tires()
+      total_sent = total_failed = 0
+      while True:
+        sent, failed = deliver_pending(options['batch_size'])
+        total_sent, total_failed = total_sent + sent, total_failed + failed
+        if sent + failed < options['batch_size']:
+          break
+      self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} emails ({total_failed} failed)'))
+      return
+    self.listening_connection = None
+    next_promotion = time.monotonic()
+    while True:
+      try:
+        if time.monotonic() >= next_promotion:
+          next_promotion = time.monotonic() + options['promote_interval']
+          promoted = Product.objects.promote_tires()
+          if promoted:
+            self.stdout.write(f'Promoted the current Tire version of {promoted} products')
+        flush_admin_digest()
+        sent, failed = deliver_pending(options['batch_size'])
+      except Exception as error: # eg. the mail server can't be reached, try again after the interval
+        self.stderr.write(f'Delivery failed: {type(error).__name__}: {error}')
+        sent = failed = 0
+      if sent or failed:
+        self.stdout.write(f'Sent {sent} emails ({failed} failed)')
+      if sent + failed < options['batch_size']:
+        self.wait(options['interval'])
+
+  # On PostgreSQL, emails queued by the web processes wake the worker up right away (see outbox.notify_outbox_worker)
+  # LISTEN only lasts as long as the database connection, so it is issued again whenever Django reconnected (eg. after the
+  # connection was lost), then the outbox is checked right away for the emails queued while nobody was listening
+  # While the database can't be reached, the connection is closed (reopened by the next query) and the worker polls every interval
+  def wait(self, interval):
+    if connection.vendor != 'postgresql':
+      time.sleep(interval)
+      return
+    try:
+      connection.ensure_connection()
+      pg_connection = connection.connection
+      if pg_connection is not self.listening_connection:
+        with connection.cursor() as cursor:
+          cursor.execute(f'LISTEN {OUTBOX_CHANNEL}')
+        self.listening_connection = pg_connection
+        return
+      with connection.wrap_database_errors:
+        if select.select([pg_connection], [], [], interval)[0]:
+          pg_connection.poll()
+          pg_connection.notifies.clear()
+    except (OperationalError, InterfaceError, OSError, ValueError) as error: # ValueError: select() on a closed connection
+      self.stderr.write(f'Not listening for new emails: {type(error).__name__}: {error}')
+      self.listening_connection = None
+      connection.close()
+      time.sleep(interval)
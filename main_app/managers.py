@@ -0,0 +1,165 @@
+from django.db import models
+from django.db.models import Case, When, F, Q, Value, Sum, Count, Subquery, OuterRef, ExpressionWrapper, IntegerField, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .search import search_tires
+
+"""
+Custom querysets for the main_app models (attached in models.py with QuerySet.as_manager())
+
+with_inventory() annotates the stock figures of each row's Product in a single query:
+  inventory_received_quantity, inventory_sold_online_quantity, inventory_sold_offline_quantity,
+  inventory_shrink_quantity and inventory_current_quantity
+The annotations are computed from the Stock ledger and fulfilled carts, with the same semantics as the Product properties
+(plus inventory_sold_quantity, which is only needed to sort on)
+
+Cart.objects.with_pricing() annotates the money figures of each cart (pricing_item_count, pricing_subtotal,
+pricing_discount_amount, pricing_tax_amount and pricing_total) so that they can be listed and sorted without per-row queries
+
+CartDetail.objects.with_relevant_tire_id() + attach_relevant_tires() resolve the Tire version of many cart items at once,
+so that rendering an order costs the same number of queries regardless of how many items it has
+"""
+
+# Sum of a related ledger column for the Product referenced by product_ref, or 0 when there are no rows
+def _ledger_sum(qs, product_ref, field):
+  total = qs.filter(product=OuterRef(product_ref)).order_by().values('product').annotate(total=Sum(field)).values('total')
+  return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+def inventory_annotations(product_ref):
+  from .models import Stock, Cart, CartDetail # Avoid circular import, models.py imports this module
+  return {
+    'inventory_received_quantity': _ledger_sum(Stock.objects.filter(quantity_change_type=Stock.RECEIVED), product_ref, 'quantity_change_value'),
+    'inventory_sold_online_quantity': _ledger_sum(CartDetail.objects.filter(cart__status=Cart.Status.FULFILLED), product_ref, 'quantity'),
+    'inventory_sold_offline_quantity': _ledger_sum(Stock.objects.filter(quantity_change_type=Stock.SOLD), product_ref, 'quantity_change_value'),
+    'inventory_shrink_quantity': _ledger_sum(Stock.objects.filter(quantity_change_type=Stock.SHRINK), product_ref, 'quantity_change_value'),
+  }
+
+# A product that was never received has no current stock (same as ProductInventory.current_quantity)
+def _current_quantity():
+  return Case(
+    When(inventory_received_quantity=0, then=Value(0)),
+    default=F('inventory_received_quantity') - F('inventory_sold_online_quantity') - F('inventory_sold_offline_quantity') - F('inventory_shrink_quantity'),
+    output_field=IntegerField(),
+  )
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+class ProductQuerySet(models.QuerySet):
+  def with_inventory(self):
+    return self.annotate(**inventory_annotations('pk')).annotate(
+      inventory_sold_quantity=F('inventory_sold_online_quantity') + F('inventory_sold_offline_quantity'),
+      inventory_current_quantity=_current_quantity(),
+    )
+
+  # The most recently added Tire version, regardless of its effective date (see Product.name)
+  def with_latest_tire_id(self):
+    from .models import Tire # Avoid circular import, models.py imports this module
+    latest = Tire.objects.filter(product=OuterRef('pk')).order_by('-id').values('id')[:1]
+    return self.annotate(latest_tire_id=Subquery(latest, output_field=IntegerField()))
+
+  # Products with a Tire version that became effective after current_tire was last set (ie. a future date_effective has passed)
+  # Both conditions are in the same filter() so that they apply to the same Tire row
+  def needing_promotion(self):
+    return self.filter(
+      Q(current_tire=None) | Q(tire__id__gt=F('current_tire')),
+      tire__date_effective__lte=timezone.now(),
+    ).distinct()
+
+  # Points current_tire at the version in effect for the products needing it and returns how many changed
+  # Run by the worker process every few minutes (see send_outbox_emails) and by the promote_tires command
+  def promote_tires(self):
+    return sum(1 for product in self.needing_promotion() if product.refresh_current_tire())
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Same as the Tire.relevant_price property
+def relevant_price_expression():
+  return Case(
+    When(use_sale_price=True, then=F('sale_price')),
+    default=F('price'),
+    output_field=DecimalField(max_digits=7, decimal_places=2),
+  )
+
+class TireQuerySet(models.QuerySet):
+  def with_inventory(self):
+    return self.annotate(**inventory_annotations('product')).annotate(inventory_current_quantity=_current_quantity())
+
+  def with_relevant_price(self):
+    return self.annotate(_relevant_price=relevant_price_expression())
+
+  # Typo-tolerant match of the query on brand, pattern, tire_type, load_speed and tread name, and/or of each keyword term
+  # on its own field (eg. brand='michelin'), annotated with search_rank (see search.py)
+  def search(self, query='', **terms):
+    return search_tires(self, query, **terms)
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+# The Tire version that was in effect at each item's date_relevant (same ordering as CartDetail.get_relevant_tire)
+def _relevant_tire(cart_detail_ref=''):
+  from .models import Tire # Avoid circular import, models.py imports this module
+  return Tire.objects.filter(
+    product=OuterRef(f'{cart_detail_ref}product'),
+    date_effective__lte=OuterRef(f'{cart_detail_ref}date_relevant'),
+  ).order_by('-date_effective', '-id')
+
+# Items of a placed order use the Tire version and price frozen on them (see Cart.freeze_totals)
+class CartDetailQuerySet(models.QuerySet):
+  def with_relevant_tire_id(self):
+    return self.annotate(relevant_tire_id=Coalesce('ordered_tire', Subquery(_relevant_tire().values('id')[:1]), output_field=IntegerField()))
+
+  # Annotates the relevant_price of each item's Tire version
+  def with_relevant_price(self):
+    relevant_price = _relevant_tire().with_relevant_price().values('_relevant_price')[:1]
+    return self.annotate(relevant_price=Case(
+      When(ordered_tire__isnull=False, then=F('price_each')),
+      default=Subquery(relevant_price),
+      output_field=DecimalField(max_digits=7, decimal_places=2),
+    ))
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+def _cart_details_aggregate(aggregate):
+  from .models import CartDetail # Avoid circular import, models.py imports this module
+  cart_details = CartDetail.objects.filter(cart=OuterRef('pk')).with_relevant_price().order_by().values('cart')
+  return Subquery(cart_details.annotate(value=aggregate).values('value'))
+
+# Placed orders use the totals frozen on the Cart, open carts are priced at the relevant Tire version of each item
+# The discount, tax and total of open carts are left unrounded (each one only repeats the subtotal subquery once):
+# they are sort keys, Cart.pricing rounds them with CartPricing.from_subtotal() for display
+class CartQuerySet(models.QuerySet):
+  def with_pricing(self):
+    money = DecimalField(max_digits=10, decimal_places=2)
+    line_total = ExpressionWrapper(F('quantity') * F('relevant_price'), output_field=money)
+    discounted = (100 - F('discount_percent_applied')) / 100
+    return self.annotate(
+      pricing_item_count=Coalesce('item_count', _cart_details_aggregate(Count('id')), Value(0), output_field=IntegerField()),
+      pricing_subtotal=Coalesce('subtotal', _cart_details_aggregate(Sum(line_total)), Value(0), output_field=money),
+    ).annotate(
+      pricing_discount_amount=Coalesce('discount_amount', F('pricing_subtotal') * F('discount_percent_applied') / 100, output_field=money),
+      pricing_tax_amount=Coalesce('tax_amount', F('pricing_subtotal') * discounted * F('tax_percent_applied') / 100, output_field=money),
+      pricing_total=Coalesce('total', F('pricing_subtotal') * discounted * (100 + F('tax_percent_applied')) / 100, output_field=money),
+    )
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Fetches the latest Tire versions of products annotated with with_latest_tire_id() in a single query
+# and caches each one's name on its product, so that Product.name no longer hits the database
+def attach_latest_tire_names(products):
+  from .models import Tire, remember_tire_lookup # Avoid circular import, models.py imports this module
+  products = list(products)
+  tires = Tire.objects.in_bulk({product.latest_tire_id for product in products})
+  for product in products:
+    tire = tires.get(product.latest_tire_id)
+    if tire:
+      remember_tire_lookup(product, 'name', tire.name, 'pk')
+  return products
+
+# Fetches the Tire versions of cart items annotated with with_relevant_tire_id() in a single query
+# and caches each one on its item, so that CartDetail.get_relevant_tire() no longer hits the database
+def attach_relevant_tires(cart_details):
+  from .models import Tire, remember_tire_lookup # Avoid circular import, models.py imports this module
+  cart_details = list(cart_details)
+  tires = Tire.objects.select_related('tread').in_bulk({cart_detail.relevant_tire_id for cart_detail in cart_details})
+  for cart_detail in cart_details:
+    remember_tire_lookup(cart_detail, 'get_relevant_tire', tires.get(cart_detail.relevant_tire_id))
+  return cart_details
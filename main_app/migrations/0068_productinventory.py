@@ -0,0 +1,57 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+STOCK_COUNTER_FIELDS = {
+    'stock received': 'received_quantity',
+    'sold': 'sold_offline_quantity',
+    'shrink': 'shrink_quantity',
+}
+
+FULFILLED = 3
+
+
+# Fills the counters from the existing Stock ledger and fulfilled carts (same as ProductInventory.rebuild())
+def backfill_inventory(apps, schema_editor):
+    Product = apps.get_model('main_app', 'Product')
+    Stock = apps.get_model('main_app', 'Stock')
+    CartDetail = apps.get_model('main_app', 'CartDetail')
+    ProductInventory = apps.get_model('main_app', 'ProductInventory')
+
+    counters = {product_id: {} for product_id in Product.objects.values_list('id', flat=True)}
+    stock_totals = Stock.objects.filter(quantity_change_type__in=STOCK_COUNTER_FIELDS).values('product_id', 'quantity_change_type').annotate(total=Sum('quantity_change_value'))
+    for row in stock_totals:
+        counters[row['product_id']][STOCK_COUNTER_FIELDS[row['quantity_change_type']]] = row['total']
+    sold_online_totals = CartDetail.objects.filter(cart__status=FULFILLED).values('product_id').annotate(total=Sum('quantity'))
+    for row in sold_online_totals:
+        counters[row['product_id']]['sold_online_quantity'] = row['total']
+    ProductInventory.objects.bulk_create([ProductInventory(product_id=product_id, **values) for product_id, values in counters.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0067_auto_20201009_1552'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductInventory',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='inventory', serialize=False, to='main_app.Product')),
+                ('received_quantity', models.IntegerField(default=0, verbose_name='🚚 Stock received')),
+                ('sold_online_quantity', models.IntegerField(default=0, verbose_name='💰 Sold online')),
+                ('sold_offline_quantity', models.IntegerField(default=0, verbose_name='💰 Sold offline')),
+                ('shrink_quantity', models.IntegerField(default=0, verbose_name='❓ Lost, damaged, administrative error, etc.')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Date Modified')),
+            ],
+            options={
+                'verbose_name': '📦 Inventory',
+                'verbose_name_plural': '📦 Inventory',
+            },
+        ),
+        migrations.RunPython(backfill_inventory, migrations.RunPython.noop),
+    ]
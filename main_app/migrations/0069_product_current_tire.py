@@ -0,0 +1,31 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+# Same resolution as Product.resolve_current()
+def backfill_current_tire(apps, schema_editor):
+    Product = apps.get_model('main_app', 'Product')
+    Tire = apps.get_model('main_app', 'Tire')
+    for product in Product.objects.all():
+        current = Tire.objects.filter(product=product, date_effective__lte=timezone.now()).order_by('id').last()
+        if current:
+            Product.objects.filter(pk=product.pk).update(current_tire=current)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0068_productinventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='current_tire',
+            field=models.ForeignKey(blank=True, editable=False, help_text='\n    The Tire version currently in effect (maintained automatically when a Tire is saved and by the promote_tires command)\n  ', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main_app.Tire', verbose_name='Current Tire version'),
+        ),
+        migrations.RunPython(backfill_current_tire, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+from decimal import Decimal
+
+
+# Same resolution and rounding as Cart.freeze_totals() for orders already placed (IN_PROGRESS, CANCELLED and FULFILLED)
+def backfill_frozen_totals(apps, schema_editor):
+    Cart = apps.get_model('main_app', 'Cart')
+    CartDetail = apps.get_model('main_app', 'CartDetail')
+    Tire = apps.get_model('main_app', 'Tire')
+    for cart in Cart.objects.filter(status__in=[2, -2, 3]):
+        item_count = 0
+        subtotal = Decimal('0')
+        for cart_detail in CartDetail.objects.filter(cart=cart):
+            tire = Tire.objects.filter(product_id=cart_detail.product_id, date_effective__lte=cart_detail.date_relevant).order_by('date_effective', 'id').last()
+            if tire:
+                cart_detail.ordered_tire = tire
+                cart_detail.price_each = tire.sale_price if tire.use_sale_price else tire.price
+                cart_detail.save(update_fields=['ordered_tire', 'price_each'])
+            item_count += 1
+            subtotal += cart_detail.quantity * cart_detail.price_each
+        subtotal = subtotal.quantize(Decimal('0.01'))
+        discount_amount = round(subtotal * cart.discount_percent_applied / 100, 2)
+        tax_amount = round((subtotal - discount_amount) * cart.tax_percent_applied / 100, 2)
+        Cart.objects.filter(pk=cart.pk).update(
+            item_count=item_count,
+            subtotal=subtotal,
+            discount_amount=discount_amount,
+            tax_amount=tax_amount,
+            total=subtotal - discount_amount + tax_amount,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0069_product_current_tire'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='discount_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Discount amount ($)'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Number of items'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Subtotal ($)'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='tax_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Tax amount ($)'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Total ($)'),
+        ),
+        migrations.AddField(
+            model_name='cartdetail',
+            name='ordered_tire',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main_app.Tire', verbose_name='Tire version ordered'),
+        ),
+        migrations.RunPython(backfill_frozen_totals, migrations.RunPython.noop),
+    ]
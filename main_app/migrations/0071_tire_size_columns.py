@@ -0,0 +1,50 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:41
+
+from django.db import migrations, models
+from main_app.sizes import parse_tire_size
+
+
+def backfill_tire_sizes(apps, schema_editor):
+    Tire = apps.get_model('main_app', 'Tire')
+    for tire in Tire.objects.all():
+        Tire.objects.filter(pk=tire.pk).update(**parse_tire_size(tire.width, tire.aspect_ratio, tire.rim_size))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0070_cart_frozen_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tire',
+            name='size_aspect_ratio',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='tire',
+            name='size_construction',
+            field=models.CharField(blank=True, editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='tire',
+            name='size_rim_diameter',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True),
+        ),
+        migrations.AddField(
+            model_name='tire',
+            name='size_service_type',
+            field=models.CharField(blank=True, editable=False, max_length=2),
+        ),
+        migrations.AddField(
+            model_name='tire',
+            name='size_width',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tire',
+            index=models.Index(condition=models.Q(updated_to=None), fields=['size_width', 'size_aspect_ratio', 'size_rim_diameter'], name='tire_current_size_idx'),
+        ),
+        migrations.RunPython(backfill_tire_sizes, migrations.RunPython.noop),
+    ]
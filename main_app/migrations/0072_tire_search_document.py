@@ -0,0 +1,48 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:43
+
+import re
+
+from django.db import migrations, models
+
+
+# Copy of search.build_search_document() at the time of this migration, so later changes to it don't change the backfill
+def build_search_document(tire):
+    values = [tire.brand, tire.pattern, tire.tire_type, tire.load_speed, tire.tread.name if tire.tread else '']
+    return ' '.join(word for value in values for word in re.findall(r'[a-z0-9]+', str(value or '').lower()))
+
+
+def backfill_search_documents(apps, schema_editor):
+    Tire = apps.get_model('main_app', 'Tire')
+    for tire in Tire.objects.select_related('tread'):
+        Tire.objects.filter(pk=tire.pk).update(search_document=build_search_document(tire))
+
+
+# pg_trgm is PostgreSQL only, other databases use the pure-Python fallback of search.py
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX tire_search_document_trgm_idx ON main_app_tire USING gin (search_document gin_trgm_ops)')
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS tire_search_document_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0071_tire_size_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tire',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
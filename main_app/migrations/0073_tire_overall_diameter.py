@@ -0,0 +1,31 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:51
+
+from django.db import migrations, models
+from main_app.sizes import overall_diameter
+
+
+def backfill_overall_diameters(apps, schema_editor):
+    Tire = apps.get_model('main_app', 'Tire')
+    for tire in Tire.objects.exclude(size_width=None):
+        diameter = overall_diameter(tire.size_width, tire.size_aspect_ratio, tire.size_rim_diameter)
+        Tire.objects.filter(pk=tire.pk).update(size_overall_diameter=diameter)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0072_tire_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tire',
+            name='size_overall_diameter',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=5, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tire',
+            index=models.Index(condition=models.Q(updated_to=None), fields=['size_overall_diameter'], name='tire_current_diameter_idx'),
+        ),
+        migrations.RunPython(backfill_overall_diameters, migrations.RunPython.noop),
+    ]
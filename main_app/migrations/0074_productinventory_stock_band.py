@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:55
+
+from django.db import migrations, models
+
+
+# Same bands as ProductInventory.get_stock_band(), the change time of existing rows is unknown
+def backfill_stock_bands(apps, schema_editor):
+    ProductInventory = apps.get_model('main_app', 'ProductInventory')
+    for inventory in ProductInventory.objects.all():
+        sold = inventory.sold_online_quantity + inventory.sold_offline_quantity
+        current = inventory.received_quantity - sold - inventory.shrink_quantity if inventory.received_quantity else 0
+        band = 'low' if current < 4 else 'high' if current >= 20 else 'limited'
+        if band != inventory.stock_band:
+            ProductInventory.objects.filter(pk=inventory.pk).update(stock_band=band)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0073_tire_overall_diameter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinventory',
+            name='stock_band',
+            field=models.CharField(default='low', editable=False, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='productinventory',
+            name='stock_band_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Stock band changed'),
+        ),
+        migrations.RunPython(backfill_stock_bands, migrations.RunPython.noop),
+    ]
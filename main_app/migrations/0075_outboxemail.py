@@ -0,0 +1,42 @@
+# Generated by Django 3.0.7 on 2026-10-18 06:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0074_productinventory_stock_band'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date Created')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Date Modified')),
+                ('to_admins', models.BooleanField(default=False, help_text='Sent to the ADMINS, like mail_admins()')),
+                ('recipients', models.TextField(blank=True, help_text='One address per line')),
+                ('from_email', models.CharField(blank=True, max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('html_body', models.TextField(blank=True)),
+                ('attach_logo', models.BooleanField(default=False, help_text='Attaches the logo inline, for the HTML emails that show it')),
+                ('status', models.IntegerField(choices=[(1, 'Pending'), (2, 'Sent'), (-1, 'Failed')], default=1)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Next attempt')),
+                ('last_error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': '✉️ Outbox Email',
+                'verbose_name_plural': '✉️ Outbox',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='outboxemail',
+            index=models.Index(condition=models.Q(status=1), fields=['next_attempt_at'], name='outbox_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.0.7 on 2026-10-18 07:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0075_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdminNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Date Created')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Date Modified')),
+                ('event', models.CharField(choices=[('signup', 'New users'), ('profile_edit', 'Profile edits'), ('order_placed', 'Orders placed'), ('order_cancelled', 'Orders cancelled')], max_length=30)),
+                ('subject', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('link', models.CharField(blank=True, help_text='Path of the admin page of the user or cart', max_length=255)),
+                ('digested_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+                ('digest', models.ForeignKey(blank=True, help_text='Digest email the event was sent in', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='main_app.OutboxEmail')),
+            ],
+            options={
+                'verbose_name': '🔔 Admin Notification',
+                'verbose_name_plural': '🔔 Admin Notifications',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='adminnotification',
+            index=models.Index(condition=models.Q(digested_at=None), fields=['created_at'], name='admin_notification_pending_idx'),
+        ),
+    ]
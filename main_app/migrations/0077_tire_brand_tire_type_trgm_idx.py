@@ -0,0 +1,30 @@
+# Generated by Django 3.0.7 on 2026-10-18 14:05
+
+from django.db import migrations
+
+
+# Used by the brand and tire_type terms of the detailed search (see search.py), PostgreSQL only like the index of 0072
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX tire_brand_trgm_idx ON main_app_tire USING gin (brand gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX tire_tire_type_trgm_idx ON main_app_tire USING gin (tire_type gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS tire_brand_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS tire_tire_type_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0076_adminnotification'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
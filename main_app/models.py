@@ -6,10 +6,19 @@ from model_utils import FieldTracker
 from django.urls import reverse
 from decimal import Decimal
 from django.utils.timezone import now
-from django.db.models import Sum
+from django.db.models import Sum, F, Count
+from django.db import transaction
 import datetime
+from collections import defaultdict
+from functools import wraps
 from django.utils import timezone
 from django.utils.html import format_html
+from django.utils.functional import cached_property
+from .managers import ProductQuerySet, TireQuerySet, CartQuerySet, CartDetailQuerySet, attach_relevant_tires
+from .pricing import CartPricing
+from .sizes import format_size, overall_diameter, parse_tire_size
+from .search import build_search_document
+from .catalog import bump_catalog_generation_on_commit
 
 # ────────────────────────────────────────────────────────────────────────────────
 
@@ -22,141 +31,191 @@ class TimeStampMixin(models.Model):
 
 # ────────────────────────────────────────────────────────────────────────────────
 
+# Memoization of Tire version lookups
+# A result is cached on the instance for as long as it lives (ie. the request) and is discarded as soon as
+# a Tire of the same product is saved or deleted (see invalidate_tire_lookups, called from signals.py)
+_tire_lookup_generations = defaultdict(int)
+
+def invalidate_tire_lookups(product_id):
+  _tire_lookup_generations[product_id] += 1
+
+# Caches a value as if the method had returned it (eg. when Tires are resolved in bulk)
+def remember_tire_lookup(instance, method_name, value, product_id_attr='product_id'):
+  generation = _tire_lookup_generations[getattr(instance, product_id_attr)]
+  instance.__dict__[f'_{method_name}_cache'] = (generation, value)
+
+# product_id_attr is the attribute holding the id of the Product the lookup depends on
+def memoized_tire_lookup(product_id_attr='product_id'):
+  def decorator(method):
+    cache_attr = f'_{method.__name__}_cache'
+    @wraps(method)
+    def wrapper(self):
+      generation = _tire_lookup_generations[getattr(self, product_id_attr)]
+      cached = self.__dict__.get(cache_attr)
+      if cached is not None and cached[0] == generation:
+        return cached[1]
+      value = method(self)
+      self.__dict__[cache_attr] = (generation, value)
+      return value
+    return wrapper
+  return decorator
+
+# ────────────────────────────────────────────────────────────────────────────────
+
 class Product(models.Model):
   is_archived_help_text = """
     When marked as archived ✔, customers will be unable to view and order this product
   """
+  current_tire_help_text = """
+    The Tire version currently in effect (maintained automatically when a Tire is saved and by the promote_tires command)
+  """
   is_archived = models.BooleanField(default=False, verbose_name='Archived', help_text=is_archived_help_text)
+  current_tire = models.ForeignKey('Tire', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+', verbose_name='Current Tire version', help_text=current_tire_help_text)
 
+  objects = ProductQuerySet.as_manager()
+
+  @memoized_tire_lookup('pk')
   def name(self):
     return self.tire_set.order_by('id').last().name
-  name.admin_order_field = 'tire'
+  name.admin_order_field = 'latest_tire_id' # See Product.objects.with_latest_tire_id()
   name = property(name)
 
+  # Stock figures are read from the denormalized ProductInventory counters (see ProductInventory below)
   @property
   def sold_online_quantity(self):
-    sold_online_quantity = 0
-    qs = self.cartdetail_set.filter(cart__status=Cart.Status.FULFILLED)
-    if qs:
-      return qs.aggregate(sold_online_quantity=Sum('quantity'))['sold_online_quantity']
-    return sold_online_quantity
+    return self.get_inventory().sold_online_quantity
   sold_online_quantity.fget.short_description = '💰 Sold online'
 
   @property
   def sold_offline_quantity(self):
-    sold_offline_quantity = 0
-    qs = self.stock_set.all().filter(quantity_change_type=Stock.SOLD)
-    if qs:
-      return qs.aggregate(sold_offline_quantity=Sum('quantity_change_value'))['sold_offline_quantity']
-    return sold_offline_quantity
+    return self.get_inventory().sold_offline_quantity
   sold_offline_quantity.fget.short_description = '💰 Sold offline'
 
   @property
   def sold_quantity(self):
-    sold_offline_quantity = 0
-    sold_online_qs = self.cartdetail_set.filter(cart__status=Cart.Status.FULFILLED)
-    sold_offline_qs = self.stock_set.all().filter(quantity_change_type=Stock.SOLD)
-    if sold_offline_qs:
-      sold_offline_quantity = sold_offline_qs.aggregate(sold_offline_quantity=Sum('quantity_change_value'))['sold_offline_quantity']
-    if sold_online_qs:
-      return sold_online_qs.aggregate(sold_quantity=Sum('quantity') + sold_offline_quantity)['sold_quantity']
-    return sold_offline_quantity
+    return self.get_inventory().sold_quantity
   sold_quantity.fget.short_description = '💰 Sold'
+  sold_quantity.fget.admin_order_field = 'inventory_sold_quantity' # See Product.objects.with_inventory()
 
   @property
   def shrink_quantity(self):
-    shrink_quantity = 0
-    qs = self.stock_set.filter(quantity_change_type=Stock.SHRINK)
-    if qs:
-      shrink_quantity = qs.aggregate(shrink_quantity=Sum('quantity_change_value'))['shrink_quantity']
-    return shrink_quantity
+    return self.get_inventory().shrink_quantity
   shrink_quantity.fget.short_description = '❓ Lost, damaged, administrative error, etc.'
 
   @property
   def current_quantity(self):
-    current_quantity = 0
-    qs = self.stock_set.filter(quantity_change_type=Stock.RECEIVED)
-    if qs:
-      current_quantity =  qs.aggregate(current_quantity=Sum('quantity_change_value') - self.sold_quantity - self.shrink_quantity)['current_quantity']
-    return current_quantity
+    return self.get_inventory().current_quantity
   current_quantity.fget.short_description = '📦 Current Stock'
+  current_quantity.fget.admin_order_field = 'inventory_current_quantity'
 
   @property
   def total_quantity(self):
-    total_quantity = 0
-    qs = self.stock_set.filter(quantity_change_type=Stock.RECEIVED)
-    if qs:
-      total_quantity = qs.aggregate(total_quantity=Sum('quantity_change_value'))['total_quantity']
-    return total_quantity
+    return self.get_inventory().total_quantity
   total_quantity.fget.short_description = 'Total'
 
   def brand(self):
     return self.get_current().brand
-  brand.admin_order_field = 'tire__brand'
+  brand.admin_order_field = 'current_tire__brand'
   brand = property(brand)
 
   def year(self):
     return self.get_current().year
-  year.admin_order_field = 'tire__year'
+  year.admin_order_field = 'current_tire__year'
   year = property(year)
 
   def width(self):
     return self.get_current().width
-  width.admin_order_field = 'tire__width'
+  width.admin_order_field = 'current_tire__width'
   width = property(width)
 
   def aspect_ratio(self):
     return self.get_current().aspect_ratio
-  aspect_ratio.admin_order_field = 'tire__aspect_ratio'
+  aspect_ratio.admin_order_field = 'current_tire__aspect_ratio'
   aspect_ratio = property(aspect_ratio)
 
   def rim_size(self):
     return self.get_current().rim_size
-  rim_size.admin_order_field = 'tire__rim_size'
+  rim_size.admin_order_field = 'current_tire__rim_size'
   rim_size = property(rim_size)
 
   def tire_type(self):
     return self.get_current().tire_type
   tire_type.short_description = 'Type'
-  tire_type.admin_order_field = 'tire__tire_type'
+  tire_type.admin_order_field = 'current_tire__tire_type'
   tire_type = property(tire_type)
 
   def pattern(self):
     return self.get_current().pattern
-  pattern.admin_order_field = 'tire__pattern'
+  pattern.admin_order_field = 'current_tire__pattern'
   pattern = property(pattern)
 
   def tread(self):
     return self.get_current().tread
   tread.short_description = 'Tread Category'
-  tread.admin_order_field = 'tire__tread'
+  tread.admin_order_field = 'current_tire__tread'
   tread = property(tread)
 
   def load_speed(self):
     return self.get_current().load_speed
   load_speed.short_description = 'Load Index/Speed Rating'
-  load_speed.admin_order_field = 'tire__load_speed'
+  load_speed.admin_order_field = 'current_tire__load_speed'
   load_speed = property(load_speed)
   
   def price(self):
     return self.get_current().price
   price.short_description = 'Price ($)'
-  price.admin_order_field = 'tire__price'
+  price.admin_order_field = 'current_tire__price'
   price = property(price)
 
   def sale_price(self):
     return self.get_current().sale_price
   sale_price.short_description = 'Sale Price ($)'
-  sale_price.admin_order_field = 'tire__sale_price'
+  sale_price.admin_order_field = 'current_tire__sale_price'
   sale_price = property(sale_price)
 
   def __str__(self):
     return self.name
 
+  # Reads the materialized current_tire pointer, only resolving from the tire_set if it hasn't been set yet
+  @memoized_tire_lookup('pk')
   def get_current(self):
+    if self.current_tire_id:
+      return self.current_tire
+    return self.resolve_current()
+
+  # Retrieves the tire version that was most recently added and is past its effective date
+  def resolve_current(self):
     qs = self.tire_set.filter(date_effective__lte=timezone.now()).order_by('id')
     return qs.last()
 
+  # Points current_tire at the resolved version, returns True if it moved
+  def refresh_current_tire(self):
+    current = self.resolve_current()
+    current_id = current.id if current else None
+    if current_id == self.current_tire_id:
+      return False
+    Product.objects.filter(pk=self.pk).update(current_tire=current)
+    self.current_tire = current
+    invalidate_tire_lookups(self.pk)
+    bump_catalog_generation_on_commit() # A version came into effect (eg. promote_tires), see views.catalog_api
+    return True
+
+  # Products that have never had any stock movement don't have a counters row yet, so fall back to an unsaved one (all zeros)
+  # When the Product was fetched with Product.objects.with_inventory(), the annotated figures are used instead (no query)
+  def get_inventory(self):
+    if hasattr(self, 'inventory_received_quantity'):
+      return ProductInventory(
+        product=self,
+        received_quantity=self.inventory_received_quantity,
+        sold_online_quantity=self.inventory_sold_online_quantity,
+        sold_offline_quantity=self.inventory_sold_offline_quantity,
+        shrink_quantity=self.inventory_shrink_quantity,
+      )
+    try:
+      return self.inventory
+    except ProductInventory.DoesNotExist:
+      return ProductInventory(product=self)
+
   class Meta:
     verbose_name = '⭐️ Product'
     verbose_name_plural = '⭐️ Products'
@@ -184,15 +243,143 @@ class Stock(TimeStampMixin):
   quantity_change_type = models.CharField(max_length=30, choices=CHANGE_TYPE_CHOICES, default=RECEIVED, verbose_name='Increase/Decrease Stock')
   quantity_change_value = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)], verbose_name='Quantity')
 
+  stock_tracker = FieldTracker(fields=['product', 'quantity_change_type', 'quantity_change_value'])
+
   def __str__(self):
     return f'{self.quantity_change_value} {self.quantity_change_type}'
 
+  # Keep the ProductInventory counters in the same transaction as the Stock row
+  # When an existing row is edited, reverse its previously saved values before applying the new ones
+  def save(self, *args, **kwargs):
+    with transaction.atomic():
+      if self._state.adding or self.stock_tracker.changed():
+        if not self._state.adding:
+          ProductInventory.record_stock(
+            self.stock_tracker.previous('product'),
+            self.stock_tracker.previous('quantity_change_type'),
+            -self.stock_tracker.previous('quantity_change_value'),
+          )
+        ProductInventory.record_stock(self.product_id, self.quantity_change_type, self.quantity_change_value)
+      super(Stock, self).save(*args, **kwargs)
+
   class Meta:
     verbose_name = '🚚 Stock'
     verbose_name_plural = '🚚 Stock'
 
 # ────────────────────────────────────────────────────────────────────────────────
 
+class ProductInventory(models.Model):
+  # Stock.quantity_change_type -> counter that it feeds
+  STOCK_COUNTER_FIELDS = {
+    Stock.RECEIVED: 'received_quantity',
+    Stock.SOLD: 'sold_offline_quantity',
+    Stock.SHRINK: 'shrink_quantity',
+  }
+
+  # Stock as shown to customers (see tire_list.html): 'Call for availability' under 4, the quantity up to 19, then '20+'
+  LOW_STOCK_QUANTITY = 4
+  HIGH_STOCK_QUANTITY = 20
+
+  product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='inventory')
+  received_quantity = models.IntegerField(default=0, verbose_name='🚚 Stock received')
+  sold_online_quantity = models.IntegerField(default=0, verbose_name='💰 Sold online')
+  sold_offline_quantity = models.IntegerField(default=0, verbose_name='💰 Sold offline')
+  shrink_quantity = models.IntegerField(default=0, verbose_name='❓ Lost, damaged, administrative error, etc.')
+  updated_at = models.DateTimeField(auto_now=True, verbose_name='Date Modified')
+  # Kept in step with the counters by refresh_stock_band(), for the price list delta feed (see feeds.py)
+  stock_band = models.CharField(max_length=7, default='low', editable=False)
+  stock_band_changed_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Stock band changed')
+
+  def __str__(self):
+    return f'Inventory for product #{self.product_id}'
+
+  @property
+  def sold_quantity(self):
+    return self.sold_online_quantity + self.sold_offline_quantity
+
+  # Same as the original ledger calculation: a product that was never received has no current stock
+  @property
+  def current_quantity(self):
+    if not self.received_quantity:
+      return 0
+    return self.received_quantity - self.sold_quantity - self.shrink_quantity
+
+  @property
+  def total_quantity(self):
+    return self.received_quantity
+
+  # 'low', 'limited' or 'high', the stock given out by the catalog API and price list instead of the exact quantity
+  @classmethod
+  def get_stock_band(cls, quantity):
+    if quantity < cls.LOW_STOCK_QUANTITY:
+      return 'low'
+    if quantity >= cls.HIGH_STOCK_QUANTITY:
+      return 'high'
+    return 'limited'
+
+  # Applies the deltas with F() expressions so that concurrent updates don't overwrite each other
+  # Pass create=False when reversing a deletion, since the counters row may itself be getting deleted along with its Product
+  @classmethod
+  def apply(cls, product_id, create=True, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+      return
+    if create:
+      cls.objects.get_or_create(product_id=product_id)
+    cls.objects.filter(product_id=product_id).update(**{field: F(field) + delta for field, delta in deltas.items()})
+    cls.refresh_stock_band(product_id)
+    bump_catalog_generation_on_commit() # The stock band of the product can change (see get_stock_band)
+
+  # Updates the stored stock_band from the counters, stamping stock_band_changed_at when it moved to another band
+  @classmethod
+  def refresh_stock_band(cls, product_id):
+    inventory = cls.objects.filter(product_id=product_id).first()
+    if inventory is None:
+      return
+    band = cls.get_stock_band(inventory.current_quantity)
+    if band != inventory.stock_band:
+      cls.objects.filter(product_id=product_id).update(stock_band=band, stock_band_changed_at=timezone.now())
+
+  # Change types that no longer exist (ie. from older versions of Stock) aren't counted, same as the ledger queries
+  @classmethod
+  def record_stock(cls, product_id, quantity_change_type, quantity, create=True):
+    field = cls.STOCK_COUNTER_FIELDS.get(quantity_change_type)
+    if field:
+      cls.apply(product_id, create=create, **{field: quantity})
+
+  # Adds (sign=1) or removes (sign=-1) every item of a cart from the sold online counters
+  @classmethod
+  def record_cart(cls, cart, sign):
+    for product_id, quantity in cart.cartdetail_set.values_list('product_id', 'quantity'):
+      cls.apply(product_id, sold_online_quantity=sign * quantity)
+
+  # Recomputes every counter from the Stock ledger and the fulfilled carts
+  @classmethod
+  def rebuild(cls):
+    products = Product.objects.with_inventory().values(
+      'id',
+      'inventory_received_quantity',
+      'inventory_sold_online_quantity',
+      'inventory_sold_offline_quantity',
+      'inventory_shrink_quantity',
+    )
+    with transaction.atomic():
+      for row in products:
+        cls.objects.update_or_create(product_id=row['id'], defaults={
+          'received_quantity': row['inventory_received_quantity'],
+          'sold_online_quantity': row['inventory_sold_online_quantity'],
+          'sold_offline_quantity': row['inventory_sold_offline_quantity'],
+          'shrink_quantity': row['inventory_shrink_quantity'],
+        })
+        cls.refresh_stock_band(row['id'])
+    return len(products)
+
+  class Meta:
+    verbose_name = '📦 Inventory'
+    verbose_name_plural = '📦 Inventory'
+
+# ────────────────────────────────────────────────────────────────────────────────
+
 class Tread(models.Model):
   name = models.CharField(max_length=30)
 
@@ -283,45 +470,117 @@ class Cart(TimeStampMixin):
   ordered_at = models.DateTimeField(null=True, blank=True, verbose_name='Date Ordered')
   closed_at = models.DateTimeField(null=True, blank=True, verbose_name='Date Closed', help_text=closed_at_help_text)
 
+  # Totals frozen when the order is placed (see freeze_totals), empty while the cart is still open
+  item_count = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Number of items')
+  subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Subtotal ($)')
+  discount_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Discount amount ($)')
+  tax_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Tax amount ($)')
+  total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False, verbose_name='Total ($)')
+
+  objects = CartQuerySet.as_manager()
+
   def __str__(self):
     return f'Cart #{self.id}'
   
   # discount_percent_applied and tax_percent_applied default values are pulled from the User when one is not explicitly entered
+  # Moving a cart to or from FULFILLED updates the sold online counters in the same transaction
+  # Placing an order (ie. moving to a state that requires shipping info) freezes its totals, reopening it unfreezes them
+  # Changing the discount or tax of a placed order (eg. from the admin) recomputes its frozen totals
   def save(self, *args, **kwargs):
     if not self.discount_percent_applied:
       self.discount_percent_applied = self.user.discount_percent
     if not self.tax_percent_applied:
       self.tax_percent_applied = self.user.tax_percent
-    super(Cart, self).save(*args, **kwargs)
+    previous_status = self.status_tracker.previous('status')
+    was_fulfilled = previous_status == Cart.Status.FULFILLED
+    is_fulfilled = self.status == Cart.Status.FULFILLED
+    with transaction.atomic():
+      if self.pk and was_fulfilled != is_fulfilled:
+        ProductInventory.record_cart(self, 1 if is_fulfilled else -1)
+      if self.pk and not Cart.does_state_require_shipping_info(previous_status) and Cart.does_state_require_shipping_info(self.status):
+        self.freeze_totals()
+      elif Cart.does_state_require_shipping_info(previous_status) and not Cart.does_state_require_shipping_info(self.status):
+        self.unfreeze_totals()
+      elif self.is_frozen and self.applied_percent_tracker.changed():
+        self.freeze_totals() # Saved below, same as refresh_frozen_totals()
+      super(Cart, self).save(*args, **kwargs)
+
+  @property
+  def is_frozen(self):
+    return self.total is not None
+
+  # Snapshots the Tire version and price of every item that doesn't have one yet, then stores the totals computed from those prices
+  # Closed orders are immutable, so their pages, emails and admin columns read these figures instead of re-resolving Tire versions
+  # Items whose product no longer has a Tire version in effect keep the price_each recorded when they were saved, without
+  # a Tire snapshot (they get one the next time the totals are refreshed)
+  def freeze_totals(self):
+    for cart_detail in attach_relevant_tires(self.cartdetail_set.filter(ordered_tire=None).with_relevant_tire_id()):
+      tire = cart_detail.get_relevant_tire()
+      if tire is None:
+        continue
+      CartDetail.objects.filter(pk=cart_detail.pk).update(ordered_tire=tire, price_each=tire.relevant_price)
+    totals = self.cartdetail_set.aggregate(item_count=Count('id'), subtotal=Sum(F('quantity') * F('price_each'), output_field=models.DecimalField(max_digits=10, decimal_places=2)))
+    pricing = CartPricing.from_subtotal(totals['item_count'], totals['subtotal'], self.discount_percent_applied, self.tax_percent_applied)
+    self.item_count = pricing.item_count
+    self.subtotal = pricing.subtotal
+    self.discount_amount = pricing.discount_amount
+    self.tax_amount = pricing.tax_amount
+    self.total = pricing.total
+    self.__dict__.pop('pricing', None)
+
+  def unfreeze_totals(self):
+    self.cartdetail_set.update(ordered_tire=None)
+    self.item_count = self.subtotal = self.discount_amount = self.tax_amount = self.total = None
+    self.__dict__.pop('pricing', None)
+
+  # Recomputes the frozen totals after one of the items of a placed order was changed (eg. from the admin)
+  def refresh_frozen_totals(self):
+    self.freeze_totals()
+    Cart.objects.filter(pk=self.pk).update(
+      item_count=self.item_count,
+      subtotal=self.subtotal,
+      discount_amount=self.discount_amount,
+      tax_amount=self.tax_amount,
+      total=self.total,
+    )
+
+  # All the money figures of the cart, computed once per instance (see pricing.py)
+  @cached_property
+  def pricing(self):
+    return CartPricing.for_cart(self)
 
   def get_subtotal(self):
-    subtotal = Decimal('0.00') # Need to use Decimal type so that 0 is displayed as 0.00
-    for cartDetail in self.cartdetail_set.all():
-      subtotal += cartDetail.quantity * cartDetail.get_relevant_tire().relevant_price
-    return subtotal
+    return self.pricing.subtotal
   get_subtotal.short_description = 'Subtotal ($)'
+  get_subtotal.admin_order_field = 'pricing_subtotal' # See Cart.objects.with_pricing()
 
   def get_discount_amount(self):
-    return round(self.get_subtotal() * self.discount_percent_applied / 100, 2)
+    return self.pricing.discount_amount
   get_discount_amount.short_description = 'Discount amount ($)'
+  get_discount_amount.admin_order_field = 'pricing_discount_amount'
 
   def get_tax_amount(self):
-    return round((self.get_subtotal() - self.get_discount_amount()) * self.tax_percent_applied / 100, 2)
+    return self.pricing.tax_amount
   get_tax_amount.short_description = 'Tax amount ($)'
+  get_tax_amount.admin_order_field = 'pricing_tax_amount'
   
   def get_total(self):
-    return self.get_subtotal() - self.get_discount_amount() + self.get_tax_amount()
+    return self.pricing.total
   get_total.short_description = 'Total ($)'
+  get_total.admin_order_field = 'pricing_total'
   
   def get_full_name(self):
     return self.user.full_name
   get_full_name.short_description = 'Full name'
+  get_full_name.admin_order_field = 'user__first_name'
     
   def get_item_count(self):
-    return self.cartdetail_set.all().count()
+    return self.pricing.item_count
   get_item_count.short_description = 'Number of items'
+  get_item_count.admin_order_field = 'pricing_item_count'
 
   status_tracker = FieldTracker(fields=['status'])
+  applied_percent_tracker = FieldTracker(fields=['discount_percent_applied', 'tax_percent_applied'])
 
   class Meta:
     constraints = [
@@ -337,6 +596,7 @@ class Cart(TimeStampMixin):
     order_number = self.ordershipping.pk
     return order_number
   get_order_number.short_description = 'Order #'
+  get_order_number.admin_order_field = 'ordershipping'
 
   class Meta:
     verbose_name = '🛒 Cart & Order'
@@ -370,6 +630,17 @@ class Tire(models.Model):
   sale_price = models.DecimalField(max_digits=7, decimal_places=2, default=0, verbose_name='Sale Price ($)')
   use_sale_price = models.BooleanField(default=False, verbose_name='On sale', help_text=use_sale_price_help_text)
 
+  # Parsed from width, aspect_ratio and rim_size on save, used by the size searches (see sizes.py)
+  size_width = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False)
+  size_aspect_ratio = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False)
+  size_rim_diameter = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False)
+  size_service_type = models.CharField(max_length=2, blank=True, editable=False) # P, LT, ST, T
+  size_construction = models.CharField(max_length=2, blank=True, editable=False) # R, ZR, D, B
+  size_overall_diameter = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, editable=False) # Inches
+  search_document = models.TextField(blank=True, editable=False) # Set on save, used by Tire.objects.search() (see search.py)
+
+  objects = TireQuerySet.as_manager()
+
   date_effective_tracker = FieldTracker(fields=['date_effective'])
   updated_to = models.OneToOneField('self', null=True, blank=True, on_delete=models.CASCADE, related_name='updated_tire_set')
   inherits_from = models.OneToOneField('self', null=True, blank=True, on_delete=models.CASCADE, related_name='inherits_tire_set')
@@ -388,6 +659,13 @@ class Tire(models.Model):
   def product_number(self):
     return self.product.id
 
+  # As written on the tire (eg. LT265/70R17), from the parsed size_* columns when the size could be parsed
+  @property
+  def size(self):
+    if self.size_width is None:
+      return f'{self.width}/{self.aspect_ratio}{self.rim_size}'
+    return format_size(self.size_service_type, self.size_width, self.size_aspect_ratio, self.size_rim_diameter, self.size_construction)
+
 
   def __str__(self):
     return self.name
@@ -403,6 +681,10 @@ class Tire(models.Model):
 
   # When a Tire instance is saved, update the CartDetail.date_relevant objects that reference that tire
   def save(self, *args, **kwargs):
+    for field, value in parse_tire_size(self.width, self.aspect_ratio, self.rim_size).items():
+      setattr(self, field, value)
+    self.size_overall_diameter = overall_diameter(self.size_width, self.size_aspect_ratio, self.size_rim_diameter)
+    self.search_document = build_search_document(self)
     cartDetails = self.product.cartdetail_set.filter(cart__status=Cart.Status.CURRENT)
     for cd in cartDetails:
       cd.date_relevant = timezone.now()
@@ -415,9 +697,10 @@ class Tire(models.Model):
   # Very important function!
   # Retrieves the tire version that was most recently add/updated and is past its effective date
   # Need to order by id (not by date_effective, since they could potentially not be entered in chronological order)
+  # This is materialized on Product.current_tire (see Product.resolve_current)
+  @memoized_tire_lookup()
   def get_updated_tire(self):
-    qs = Tire.objects.filter(Q(product=self.product) & Q(date_effective__lte=timezone.now())).order_by('id')
-    return qs.last()
+    return self.product.get_current()
 
   # Doesn't take into account the date_effective
   # def get_updated_tire(self):
@@ -462,6 +745,11 @@ class Tire(models.Model):
   class Meta:
     verbose_name = '📜 Tire Details'
     verbose_name_plural = '📜 Tire Details'
+    indexes = [
+      # Size searches only look at the most recent versions
+      models.Index(fields=['size_width', 'size_aspect_ratio', 'size_rim_diameter'], condition=Q(updated_to=None), name='tire_current_size_idx'),
+      models.Index(fields=['size_overall_diameter'], condition=Q(updated_to=None), name='tire_current_diameter_idx'),
+    ]
 
 from string import Template
 class DeltaTemplate(Template):
@@ -473,16 +761,19 @@ class CartDetail(TimeStampMixin):
   cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
   product = models.ForeignKey(Product, on_delete=models.CASCADE)
   quantity = models.PositiveIntegerField(default=1)
-  # TODO: Remove price_each field since price is obtained through the Tire model
+  # Set to the Tire's price on creation, then to the price of the Tire version ordered when the order is placed
   price_each = models.DecimalField(max_digits=7, decimal_places=2, blank=True, verbose_name='Price per item ($)')
   date_relevant = models.DateTimeField(default=now, blank=True, verbose_name='Date Relevant') # Need this to know which Tire version to use for invoices
+  ordered_tire = models.ForeignKey('Tire', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+', verbose_name='Tire version ordered') # Frozen with price_each when the order is placed (Tire versions are never edited in place)
   # TODO: Update the date_relevant field for cartdetails that in a IN_PROGRESS cart every x minutes so that buyers can't hold on to an old reference of a Tire if it's price and other details have been updated
 
+  objects = CartDetailQuerySet.as_manager()
+
   def __str__(self):
     return f'{self.product.get_current()} - QTY: {self.quantity}'
 
   def get_subtotal(self):
-    return self.quantity * self.get_relevant_tire().relevant_price
+    return self.quantity * self.price
   get_subtotal.short_description = 'Subtotal ($)'
 
   class Meta:
@@ -491,24 +782,42 @@ class CartDetail(TimeStampMixin):
       models.UniqueConstraint(fields=['cart', 'product'], name='unique_product_per_cart'),
     ]
 
+  quantity_tracker = FieldTracker(fields=['quantity'])
+
   # When saving for the first time, use the Tire's price
+  # Quantity changes on an already fulfilled cart are applied to the sold online counters
   def save(self, *args, **kwargs):
     if not self.price_each:
       self.price_each = self.product.get_current().price
-    super(CartDetail, self).save(*args, **kwargs)
+    with transaction.atomic():
+      if self.cart.status == Cart.Status.FULFILLED:
+        ProductInventory.apply(self.product_id, sold_online_quantity=self.quantity - (self.quantity_tracker.previous('quantity') or 0))
+      super(CartDetail, self).save(*args, **kwargs)
+      if self.cart.is_frozen:
+        self.cart.refresh_frozen_totals()
     if self.quantity == 0:
       self.delete()
 
+  # Items of a placed order use the Tire version frozen on them
+  # Otherwise it's already cached when the item was resolved in bulk with attach_relevant_tires()
+  @memoized_tire_lookup()
   def get_relevant_tire(self):
+    if self.ordered_tire_id:
+      return self.ordered_tire
     qs = self.product.tire_set.filter(date_effective__lte=self.date_relevant).order_by('date_effective', 'id')
     return qs.last()
 
+  # The most recent version by date_effective among those in effect, like get_relevant_tire (Product.current_tire is the most
+  # recently entered one instead, see Tire.get_updated_tire)
+  @memoized_tire_lookup()
   def get_updated_tire(self):
-    qs = self.product.tire_set.filter(date_effective__lte=timezone.now()).order_by('date_effective')
+    qs = self.product.tire_set.filter(date_effective__lte=timezone.now()).order_by('date_effective', 'id')
     return qs.last()
 
   @property
   def price(self):
+    if self.ordered_tire_id:
+      return self.price_each
     return self.get_relevant_tire().relevant_price
   price.fget.short_description = 'Price ($)'
 
@@ -569,4 +878,75 @@ class OrderShipping(models.Model):
 
   class Meta:
     verbose_name = '📦 Shipping Info'
-    verbose_name_plural = '📦 Shipping Info'
\ No newline at end of file
+    verbose_name_plural = '📦 Shipping Info'
+# ────────────────────────────────────────────────────────────────────────────────
+
+# Emails waiting to be sent by the send_outbox_emails worker (see outbox.py)
+# They are written in the same transaction as the change they are about, so they are only sent if it is committed
+class OutboxEmail(TimeStampMixin):
+  class Status(models.IntegerChoices):
+    PENDING = 1
+    SENT = 2
+    FAILED = -1 # Dead letter, gave up after OUTBOX_MAX_ATTEMPTS attempts
+
+  to_admins = models.BooleanField(default=False, help_text='Sent to the ADMINS, like mail_admins()')
+  recipients = models.TextField(blank=True, help_text='One address per line')
+  from_email = models.CharField(max_length=254, blank=True)
+  subject = models.CharField(max_length=255)
+  body = models.TextField()
+  html_body = models.TextField(blank=True)
+  attach_logo = models.BooleanField(default=False, help_text='Attaches the logo inline, for the HTML emails that show it')
+  status = models.IntegerField(choices=Status.choices, default=Status.PENDING)
+  attempts = models.PositiveIntegerField(default=0)
+  next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Next attempt')
+  last_error = models.TextField(blank=True)
+  sent_at = models.DateTimeField(null=True, blank=True)
+
+  def __str__(self):
+    return self.subject
+
+  @property
+  def recipient_list(self):
+    return [address for address in self.recipients.splitlines() if address]
+
+  class Meta:
+    verbose_name = '✉️ Outbox Email'
+    verbose_name_plural = '✉️ Outbox'
+    indexes = [
+      # The worker only looks for pending emails that are due
+      models.Index(fields=['next_attempt_at'], condition=Q(status=1), name='outbox_pending_idx'),
+    ]
+
+# Event waiting to be sent to the admins in the next digest email (see notifications.py)
+class AdminNotification(TimeStampMixin):
+  class Event(models.TextChoices):
+    SIGNUP = 'signup', 'New users'
+    PROFILE_EDIT = 'profile_edit', 'Profile edits'
+    ORDER_PLACED = 'order_placed', 'Orders placed'
+    ORDER_CANCELLED = 'order_cancelled', 'Orders cancelled'
+
+  event = models.CharField(max_length=30, choices=Event.choices)
+  subject = models.CharField(max_length=255)
+  message = models.TextField()
+  link = models.CharField(max_length=255, blank=True, help_text='Path of the admin page of the user or cart')
+  digest = models.ForeignKey(OutboxEmail, null=True, blank=True, on_delete=models.SET_NULL, related_name='notifications', help_text='Digest email the event was sent in')
+  digested_at = models.DateTimeField(null=True, blank=True, verbose_name='Sent at')
+
+  def __str__(self):
+    return self.subject
+
+  class Meta:
+    verbose_name = '🔔 Admin Notification'
+    verbose_name_plural = '🔔 Admin Notifications'
+    indexes = [
+      # The digest only looks for the events that haven't been sent yet
+      models.Index(fields=['created_at'], condition=Q(digested_at=None), name='admin_notification_pending_idx'),
+    ]
+
+# Counters shared by every worker (eg. the catalog generation, see catalog.py), incremented atomically in the database
+class CatalogCounter(models.Model):
+  name = models.CharField(max_length=30, primary_key=True)
+  value = models.BigIntegerField()
+
+  def __str__(self):
+    return f'{self.name}: {self.value}'
@@ -0,0 +1,64 @@
+import datetime
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import AdminNotification
+from .outbox import queue_mail_admins
+
+"""
+Digests of the admin notifications
+
+Instead of one email per signup, profile edit or order, notify_admins() records the event in the AdminNotification table and
+flush_admin_digest() sends the pending events to the ADMINS in a single email once the oldest one has waited for
+ADMIN_DIGEST_WINDOW seconds, with a link to the admin page of each user or cart
+The send_outbox_emails worker (see Procfile) flushes the digest before delivering the outbox
+The ADMIN_URGENT_EVENTS (order cancellations by default, which must be caught before the order is shipped) skip the digest
+and are queued in the outbox right away
+"""
+
+ADMIN_DIGEST_WINDOW = getattr(settings, 'ADMIN_DIGEST_WINDOW', 15 * 60) # Seconds
+ADMIN_URGENT_EVENTS = set(getattr(settings, 'ADMIN_URGENT_EVENTS', [AdminNotification.Event.ORDER_CANCELLED]))
+ADMIN_SITE_URL = getattr(settings, 'ADMIN_SITE_URL', 'https://www.roadstartirewholesale.ca')
+
+# event is an AdminNotification.Event, link the path of the admin page the event is about,
+# eg. reverse('admin:main_app_cart_change', args=[cart.id])
+def notify_admins(event, subject, message, link=''):
+  if event in ADMIN_URGENT_EVENTS:
+    return queue_mail_admins(subject, f'{message}\n{ADMIN_SITE_URL}{link}' if link else message)
+  return AdminNotification.objects.create(event=event, subject=subject, message=message, link=link)
+
+# Sends the pending events in one digest email (through the outbox) when the oldest one is at least ADMIN_DIGEST_WINDOW old,
+# or right away with force=True, and returns the number of events it contains
+# The events are locked while the digest is queued (and skipped by other workers) so that an event is never sent twice
+def flush_admin_digest(force=False):
+  now = timezone.now()
+  with transaction.atomic():
+    notifications = list(AdminNotification.objects.select_for_update(skip_locked=True).filter(digested_at=None).order_by('created_at', 'id'))
+    if not notifications:
+      return 0
+    if not force and notifications[0].created_at > now - datetime.timedelta(seconds=ADMIN_DIGEST_WINDOW):
+      return 0
+    subject, message = render_admin_digest(notifications)
+    digest = queue_mail_admins(subject, message)
+    AdminNotification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(digest=digest, digested_at=now)
+  return len(notifications)
+
+# (subject, message) of the digest, with the events grouped by type, eg. "4 events: Orders placed (3), New users (1)"
+def render_admin_digest(notifications):
+  groups = {}
+  for notification in notifications:
+    groups.setdefault(notification.event, []).append(notification)
+  counts = []
+  lines = []
+  for event, label in AdminNotification.Event.choices:
+    if event not in groups:
+      continue
+    heading = f'{label} ({len(groups[event])})'
+    counts.append(heading)
+    lines.append(heading)
+    for notification in groups[event]:
+      lines.append(f'  {timezone.localtime(notification.created_at):%b %d %H:%M}  {notification.subject}')
+      if notification.link:
+        lines.append(f'    {ADMIN_SITE_URL}{notification.link}')
+    lines.append('')
+  return f'{len(notifications)} events: {", ".join(counts)}', '\n'.join(lines)
@@ -0,0 +1,214 @@
+import datetime
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib import messages
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.translation import ngettext
+from .emails import logo_image
+from .models import OutboxEmail
+
+"""
+Transactional email outbox
+
+Instead of talking to the SMTP server in the request (TLS handshake and all), queue_mail() and queue_mail_admins() write
+an OutboxEmail row in the current transaction, so an email is only sent if the change it is about is committed
+The send_outbox_emails worker (see Procfile) delivers the pending rows with deliver_pending():
+  a failed attempt is retried later, with an exponential backoff (OUTBOX_RETRY_DELAY * 2^attempts, up to OUTBOX_MAX_RETRY_DELAY)
+  after OUTBOX_MAX_ATTEMPTS attempts the email is marked FAILED (dead letter), it can be retried from the admin
+On PostgreSQL, the worker is woken up with a NOTIFY once the transaction that queued an email is committed
+Bulk admin actions don't wait for the worker, they collect the emails they queue with outbox_batch() and send them
+together over one connection
+
+Emails are delivered with EMAIL_BACKEND, which can be pointed at the console or file backends to deliver them locally
+"""
+
+OUTBOX_CHANNEL = 'outbox_email'
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 8)
+OUTBOX_RETRY_DELAY = getattr(settings, 'OUTBOX_RETRY_DELAY', 30) # Seconds
+OUTBOX_MAX_RETRY_DELAY = getattr(settings, 'OUTBOX_MAX_RETRY_DELAY', 60 * 60)
+
+# Same arguments as send_mail(), attach_logo=True for the HTML emails that show the logo
+def queue_mail(subject, message, recipient_list, html_message=None, from_email=None, attach_logo=False):
+  return _queue(
+    subject=subject,
+    body=message,
+    html_body=html_message or '',
+    recipients='\n'.join(recipient_list),
+    from_email=from_email or settings.EMAIL_HOST_USER,
+    attach_logo=attach_logo,
+  )
+
+# Same arguments as mail_admins(), the ADMINS are looked up when the email is sent
+def queue_mail_admins(subject, message, html_message=None):
+  return _queue(subject=subject, body=message, html_body=html_message or '', to_admins=True)
+
+# Emails queued inside an outbox_batch() don't wake the worker up, the batch sends them itself (and wakes it for the rest)
+def _queue(**fields):
+  email = OutboxEmail.objects.create(**fields)
+  batches = getattr(_batches, 'stack', ())
+  for batch in batches:
+    batch.emails.append(email)
+  if not batches:
+    transaction.on_commit(notify_outbox_worker)
+  return email
+
+def notify_outbox_worker():
+  if connection.vendor == 'postgresql':
+    with connection.cursor() as cursor:
+      cursor.execute('SELECT pg_notify(%s, %s)', [OUTBOX_CHANNEL, ''])
+
+def build_message(email, connection=None):
+  if email.to_admins:
+    message = EmailMultiAlternatives(
+      f'{settings.EMAIL_SUBJECT_PREFIX}{email.subject}',
+      email.body,
+      settings.SERVER_EMAIL,
+      [address for name, address in settings.ADMINS],
+      connection=connection,
+    )
+  else:
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email or None, email.recipient_list, connection=connection)
+  if email.html_body:
+    message.attach_alternative(email.html_body, 'text/html')
+  if email.attach_logo:
+    message.mixed_subtype = 'related'
+    message.attach(logo_image())
+  return message
+
+def retry_delay(attempts):
+  return datetime.timedelta(seconds=min(OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), OUTBOX_MAX_RETRY_DELAY))
+
+# Sends up to batch_size pending emails that are due, over a single connection, and returns (sent, failed) counts
+def deliver_pending(batch_size=50):
+  emails = _claim(
+    OutboxEmail.objects.select_for_update(skip_locked=True).filter(status=OutboxEmail.Status.PENDING, next_attempt_at__lte=timezone.now()).order_by('next_attempt_at', 'id')[:batch_size]
+  )
+  sent, failed = _send(emails)
+  return sent, len(failed)
+
+# Sends the given emails right away (those still pending), over a single connection, and returns (sent count, failed emails)
+# Failed emails stay in the outbox, the worker retries them
+def deliver(emails):
+  return _send(_claim(
+    OutboxEmail.objects.select_for_update(skip_locked=True).filter(pk__in=[email.pk for email in emails], status=OutboxEmail.Status.PENDING).order_by('id')
+  ))
+
+# Claims the emails of the (locked) queryset in a short transaction: each one counts as an attempt and its next attempt is
+# pushed back by the retry delay, which leases it to this worker while it is sent (other workers skip it until then, and
+# retry it if this worker dies before recording the result)
+def _claim(queryset):
+  now = timezone.now()
+  with transaction.atomic():
+    emails = list(queryset)
+    for email in emails:
+      email.attempts += 1
+      email.next_attempt_at = now + retry_delay(email.attempts)
+      email.updated_at = now
+    OutboxEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at', 'updated_at'])
+  return emails
+
+# Every message is built and the connection is opened before anything is sent, then they are sent one by one on that connection
+# (send_messages() stops at the first error, so each call gets a single message to know which ones failed)
+# Nothing is sent inside a transaction, each result is recorded on its own
+def _send(emails):
+  sent, failed = 0, []
+  if not emails:
+    return sent, failed
+  mail_connection = get_connection()
+  try:
+    built = [build_message(email, mail_connection) for email in emails]
+    mail_connection.open()
+  except Exception as error: # The mail server can't be reached or refused the login: a failed attempt for every email
+    for email in emails:
+      _record_failure(email, error)
+    return sent, list(emails)
+  try:
+    for email, message in zip(emails, built):
+      try:
+        mail_connection.send_messages([message])
+      except Exception as error: # Any delivery error (SMTP, socket, bad address...) is retried
+        _record_failure(email, error)
+        failed.append(email)
+      else:
+        sent += 1
+        email.status = OutboxEmail.Status.SENT
+        email.sent_at = timezone.now()
+        email.last_error = ''
+        email.save(update_fields=['status', 'sent_at', 'last_error', 'updated_at'])
+  finally:
+    mail_connection.close()
+  return sent, failed
+
+# The next attempt was already scheduled when the email was claimed, after OUTBOX_MAX_ATTEMPTS attempts it is a dead letter
+def _record_failure(email, error):
+  email.last_error = f'{type(error).__name__}: {error}'
+  if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+    email.status = OutboxEmail.Status.FAILED
+  email.save(update_fields=['status', 'last_error', 'updated_at'])
+
+# ────────────────────────────────────────────────────────────────────────────────
+
+_batches = threading.local()
+
+# Collects the emails queued inside the block (eg. by the signal handlers of the carts an admin action saves),
+# so they can be sent together over a single connection once the block is done:
+#   with outbox_batch() as batch:
+#     for cart in carts: cart.save()
+#   sent, failed = batch.deliver()
+class OutboxBatch:
+  def __init__(self):
+    self.emails = []
+
+  # The worker is woken up for the emails that couldn't be sent here (not claimed, or the delivery raised)
+  def deliver(self):
+    try:
+      sent, failed = deliver(self.emails)
+    except Exception:
+      transaction.on_commit(notify_outbox_worker)
+      raise
+    if sent + len(failed) < len(self.emails):
+      transaction.on_commit(notify_outbox_worker)
+    return sent, failed
+
+@contextmanager
+def outbox_batch():
+  batch = OutboxBatch()
+  stack = _batches.__dict__.setdefault('stack', [])
+  stack.append(batch)
+  try:
+    yield batch
+  finally:
+    stack.remove(batch)
+
+# For the ModelAdmins whose bulk changes queue emails (actions, and list_editable edits of the change list):
+# the emails queued while the change list handles a POST are sent together over a single connection, and the ones
+# that failed are reported with message_user() (the worker retries them)
+class OutboxBatchAdminMixin:
+  def changelist_view(self, request, extra_context=None):
+    if request.method != 'POST':
+      return super().changelist_view(request, extra_context)
+    with outbox_batch() as batch:
+      response = super().changelist_view(request, extra_context)
+    self.deliver_emails(request, batch)
+    return response
+
+  def deliver_emails(self, request, batch):
+    if not batch.emails:
+      return
+    try:
+      sent, failed = batch.deliver()
+    except Exception as error: # The mail server can't be reached
+      self.message_user(request, f'The emails could not be sent right away ({error}), they will be retried shortly.', messages.WARNING)
+      return
+    if sent:
+      self.message_user(request, ngettext('%d email was sent.', '%d emails were sent.', sent) % sent, messages.SUCCESS)
+    if failed:
+      details = '; '.join(f'{", ".join(email.recipient_list) or "Admins"}: {email.last_error}' for email in failed)
+      self.message_user(request, ngettext(
+        '%d email could not be sent and will be retried (%s).',
+        '%d emails could not be sent and will be retried (%s).',
+        len(failed),
+      ) % (len(failed), details), messages.WARNING)
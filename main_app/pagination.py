@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+from django.db import connections
+from django.db.models import Q, Value, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+"""
+Keyset (cursor) pagination for the tire_list results
+
+Instead of a page number (COUNT(*) + OFFSET scan on every page), a page is requested with an opaque cursor holding the
+(sort value, id) of the row it continues from, so each page only reads its own rows:
+  KeysetPaginator pages through a queryset (WHERE (value, id) > cursor ORDER BY value, id LIMIT 21)
+  SequenceKeysetPaginator pages through the (value, id) keys of an in-memory result, eg. from the catalog index (see catalog.py)
+Cursors are passed around in the 'cursor' query parameter (see tire_list.html, which sets it with url_replace)
+"""
+
+# Sorts offered by tire_list and the column each one is keyed on (tires without a parsed width sort as 0)
+SORT_FIELDS = {
+  'price': 'price',
+  'width': 'size_width',
+}
+
+def encode_cursor(sort, direction, key):
+  value, pk = key
+  payload = json.dumps([sort, direction, str(value), pk], separators=(',', ':')).encode()
+  return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+# Returns (direction, (value, id)), or None for a missing, tampered or stale cursor (eg. from another sort)
+def decode_cursor(cursor, sort):
+  if not cursor:
+    return None
+  try:
+    payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    cursor_sort, direction, value, pk = json.loads(payload)
+    if cursor_sort != sort or direction not in ('next', 'previous'):
+      return None
+    return direction, (Decimal(value), int(pk))
+  except (binascii.Error, ValueError, TypeError, InvalidOperation):
+    return None
+
+# Planner estimate of the number of rows (PostgreSQL), exact count on other databases
+def approximate_count(queryset):
+  connection = connections[queryset.db]
+  if connection.vendor != 'postgresql':
+    return queryset.count()
+  sql, params = queryset.order_by().values('pk').query.sql_with_params()
+  with connection.cursor() as cursor:
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+  if isinstance(plan, str):
+    plan = json.loads(plan)
+  return int(plan[0]['Plan']['Plan Rows'])
+
+class KeysetPage:
+  def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+    self.object_list = object_list
+    self.paginator = paginator
+    self.next_cursor = next_cursor
+    self.previous_cursor = previous_cursor
+
+  def __repr__(self):
+    return f'<KeysetPage of {len(self.object_list)} tires>'
+
+  def __len__(self):
+    return len(self.object_list)
+
+  def __iter__(self):
+    return iter(self.object_list)
+
+  def __getitem__(self, index):
+    return self.object_list[index]
+
+  def has_next(self):
+    return self.next_cursor is not None
+
+  def has_previous(self):
+    return self.previous_cursor is not None
+
+class KeysetPaginator:
+  is_approximate = True
+
+  def __init__(self, queryset, sort, per_page=20):
+    self.sort = sort
+    self.descending = sort.startswith('-')
+    self.field = SORT_FIELDS[sort.lstrip('-')]
+    self.queryset = queryset
+    self.per_page = per_page
+
+  @cached_property
+  def count(self):
+    return approximate_count(self.queryset)
+
+  def get_page(self, cursor=None):
+    decoded = decode_cursor(cursor, self.sort)
+    direction, key = decoded if decoded else ('next', None)
+    backwards = direction == 'previous'
+    rows = self._rows(key, increasing=self.descending == backwards)
+    has_more = len(rows) > self.per_page
+    rows = rows[:self.per_page]
+    if backwards:
+      rows.reverse()
+    has_next = key is not None if backwards else has_more
+    has_previous = has_more if backwards else key is not None
+    return KeysetPage(
+      self._objects(rows),
+      self,
+      next_cursor=encode_cursor(self.sort, 'next', self._key(rows[-1])) if has_next and rows else None,
+      previous_cursor=encode_cursor(self.sort, 'previous', self._key(rows[0])) if has_previous and rows else None,
+    )
+
+  # Up to per_page + 1 rows past the key, in the order they are traversed
+  def _rows(self, key, increasing):
+    queryset = self.queryset.annotate(keyset_value=Coalesce(self.field, Value(Decimal('0')), output_field=DecimalField()))
+    if key is not None:
+      value, pk = key
+      if increasing:
+        queryset = queryset.filter(Q(keyset_value__gt=value) | Q(keyset_value=value, pk__gt=pk))
+      else:
+        queryset = queryset.filter(Q(keyset_value__lt=value) | Q(keyset_value=value, pk__lt=pk))
+    ordering = ('keyset_value', 'pk') if increasing else ('-keyset_value', '-pk')
+    return list(queryset.order_by(*ordering)[:self.per_page + 1])
+
+  def _key(self, row):
+    return (row.keyset_value, row.pk)
+
+  def _objects(self, rows):
+    return rows
+
+# keys: the (value, id) of every result in ascending order, fetch: returns the objects of a list of ids (in any order)
+class SequenceKeysetPaginator(KeysetPaginator):
+  is_approximate = False
+
+  def __init__(self, keys, sort, fetch, per_page=20):
+    super().__init__(None, sort, per_page)
+    self.keys = keys
+    self.fetch = fetch
+
+  @cached_property
+  def count(self):
+    return len(self.keys)
+
+  def _rows(self, key, increasing):
+    if increasing:
+      start = bisect_right(self.keys, key) if key is not None else 0
+      return self.keys[start:start + self.per_page + 1]
+    end = bisect_left(self.keys, key) if key is not None else len(self.keys)
+    return self.keys[max(0, end - self.per_page - 1):end][::-1]
+
+  def _key(self, row):
+    return row
+
+  def _objects(self, rows):
+    objects = self.fetch([pk for value, pk in rows])
+    return [objects[pk] for value, pk in rows if pk in objects]
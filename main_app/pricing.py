@@ -0,0 +1,40 @@
+from decimal import Decimal
+from django.db.models import Count, Sum, F, ExpressionWrapper, DecimalField
+
+"""
+CartPricing holds every money figure of a Cart, computed together in one pass
+
+Cart.get_subtotal() used to be recomputed (one query per item) by get_discount_amount(), get_tax_amount() and get_total(),
+so a single total cost 4 full subtotal computations. Build it once with CartPricing.for_cart(cart) (or use the cached Cart.pricing)
+The Decimal rounding is the same as the original Cart methods
+"""
+
+class CartPricing:
+  def __init__(self, item_count, subtotal, discount_amount, tax_amount, total):
+    self.item_count = item_count
+    self.subtotal = subtotal
+    self.discount_amount = discount_amount
+    self.tax_amount = tax_amount
+    self.total = total
+
+  def __repr__(self):
+    return f'<CartPricing items={self.item_count} subtotal={self.subtotal} total={self.total}>'
+
+  @classmethod
+  def from_subtotal(cls, item_count, subtotal, discount_percent, tax_percent):
+    subtotal = (subtotal or Decimal('0')).quantize(Decimal('0.01')) # Always 2 decimal places so that 0 is displayed as 0.00
+    discount_amount = round(subtotal * discount_percent / 100, 2)
+    tax_amount = round((subtotal - discount_amount) * tax_percent / 100, 2)
+    return cls(item_count, subtotal, discount_amount, tax_amount, subtotal - discount_amount + tax_amount)
+
+  # Placed orders use the totals frozen on the Cart and carts from Cart.objects.with_pricing() their annotations (no query)
+  # Otherwise the item count and subtotal come from a single aggregate query, with each item priced at its relevant Tire version
+  @classmethod
+  def for_cart(cls, cart):
+    if cart.is_frozen:
+      return cls(cart.item_count, cart.subtotal, cart.discount_amount, cart.tax_amount, cart.total)
+    if hasattr(cart, 'pricing_subtotal'):
+      return cls.from_subtotal(cart.pricing_item_count, cart.pricing_subtotal, cart.discount_percent_applied, cart.tax_percent_applied)
+    line_total = ExpressionWrapper(F('quantity') * F('relevant_price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    totals = cart.cartdetail_set.with_relevant_price().aggregate(item_count=Count('id'), subtotal=Sum(line_total))
+    return cls.from_subtotal(totals['item_count'], totals['subtotal'], cart.discount_percent_applied, cart.tax_percent_applied)
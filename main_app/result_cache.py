@@ -0,0 +1,50 @@
+import hashlib
+from .catalog import get_catalog_generation, get_catalog_index, get_cached, set_cached, search_key
+from .pagination import KeysetPage
+
+"""
+Cache of the tire_list result pages
+
+A page is cached as the ids of its tires and its metadata (count and cursors), under a key made of the catalog generation
+(see catalog.py), the normalized search (see catalog.search_key), the sort and the cursor. Any change to the tires or
+the stock moves to a new generation, so a cached page is never served once the catalog changed. The tires of a cached
+page are fetched again, with their current prices and stock
+
+Like the facets, pages are looked up in the cache of the worker first, then in the cache shared by every worker
+(see catalog.get_cached), so a page computed by one worker is reused by the others
+The generation is read before the index version (see catalog.get_catalog_index), which is bumped before the generation, so
+a page is always computed from an index that has every tire change up to the generation of its key
+"""
+
+RESULTS_CACHE_TIMEOUT = 60 * 60
+
+# Stands in for the paginator of a cached page (tire_list.html only shows its count)
+class CachedPaginator:
+  def __init__(self, count, is_approximate):
+    self.count = count
+    self.is_approximate = is_approximate
+
+def _cache_key(generation, lookups, terms, sort, cursor):
+  page = hashlib.md5(f'{sort}:{cursor or ""}'.encode()).hexdigest()
+  return f'results:{generation}:{search_key(lookups, terms)}:{page}'
+
+# Returns (paginator, page) of the search, paginate(index) computes them with the catalog index when the page isn't cached
+# and fetch(ids) returns the tires of a cached page as {id: tire}
+def cached_tire_page(lookups, terms, sort, cursor, paginate, fetch):
+  generation = get_catalog_generation()
+  key = _cache_key(generation, lookups, terms, sort, cursor)
+  entry = get_cached(key, RESULTS_CACHE_TIMEOUT)
+  if entry is None:
+    paginator, page = paginate(get_catalog_index())
+    set_cached(key, {
+      'ids': [tire.pk for tire in page.object_list],
+      'count': paginator.count,
+      'is_approximate': paginator.is_approximate,
+      'next_cursor': page.next_cursor,
+      'previous_cursor': page.previous_cursor,
+    }, RESULTS_CACHE_TIMEOUT)
+    return paginator, page
+  paginator = CachedPaginator(entry['count'], entry['is_approximate'])
+  tires = fetch(entry['ids'])
+  object_list = [tires[pk] for pk in entry['ids'] if pk in tires]
+  return paginator, KeysetPage(object_list, paginator, entry['next_cursor'], entry['previous_cursor'])
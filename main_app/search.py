@@ -0,0 +1,124 @@
+import re
+import struct
+from django.db import connections, models
+from django.db.models import Case, When, Func, Lookup, Value, F, ExpressionWrapper, FloatField
+
+"""
+Typo-tolerant search over the tire catalog (brand, pattern, tire_type, load_speed and tread name)
+
+Those values are kept lowercased in Tire.search_document (set in Tire.save, and from signals.py when a Tread is renamed)
+A search is made of terms, each matched against one field: search_document for the free text searches (tire_search and
+the admin), brand and tire_type for the inputs of the detailed search, and a tire matches when every term does
+A term matches a value when pg_trgm's word similarity between them is at least WORD_SIMILARITY_THRESHOLD:
+  on PostgreSQL, search_tires() uses the word similarity operator (%>), backed by GIN trigram indexes on the three fields
+  (see migrations 0072 and 0077)
+  other databases (ie. SQLite test runs) and the catalog index of each worker (see catalog.py) use word_similarity() below,
+  a port of pg_trgm's, so a search gets the same tires whichever of them answers it
+"""
+
+# Same as pg_trgm's default pg_trgm.word_similarity_threshold
+WORD_SIMILARITY_THRESHOLD = 0.6
+
+# Fields a term can be matched against
+SEARCH_FIELDS = ('search_document', 'brand', 'tire_type')
+
+def words(text):
+  return re.findall(r'[a-z0-9]+', str(text or '').lower())
+
+def build_search_document(tire):
+  values = [tire.brand, tire.pattern, tire.tire_type, tire.load_speed, tire.tread.name if tire.tread else '']
+  return ' '.join(word for value in values for word in words(value))
+
+# Trigrams of the text in order, each word padded with two spaces in front and one at the end, like pg_trgm does
+def trigrams(text):
+  return [padded[i:i + 3] for padded in (f'  {word} ' for word in words(text)) for i in range(len(padded) - 2)]
+
+# pg_trgm computes similarities as float4
+def _similarity(count, query_length, extent_length):
+  return struct.unpack('f', struct.pack('f', count / (query_length + extent_length - count)))[0]
+
+# Same as pg_trgm's word_similarity(query, document) (iterate_word_similarity() in trgm_op.c): the greatest similarity
+# between the trigrams of the query and a continuous extent of the trigrams of the document, found in a single pass that
+# moves the upper bound of the extent to each trigram of the query and the lower bound to where the similarity is highest
+def word_similarity(query, document):
+  query_trigrams = set(trigrams(query))
+  document_trigrams = trigrams(document)
+  if not query_trigrams:
+    return 0.0
+  last_positions = {} # Last position of each trigram in the extent
+  extent_length = count = 0 # Distinct trigrams in the extent, and how many of them are in the query
+  lower = -1
+  best = 0.0
+  for upper, trigram in enumerate(document_trigrams):
+    found = trigram in query_trigrams
+    if lower >= 0 or found:
+      if last_positions.get(trigram, -1) < 0:
+        extent_length += 1
+        count += found
+      last_positions[trigram] = upper
+    if not found:
+      continue
+    if lower == -1:
+      lower, extent_length = upper, 1
+    similarity = _similarity(count, len(query_trigrams), extent_length)
+    previous_lower, tmp_extent_length, tmp_count = lower, extent_length, count
+    for tmp_lower in range(lower, upper + 1):
+      tmp_similarity = _similarity(tmp_count, len(query_trigrams), tmp_extent_length)
+      if tmp_similarity > similarity:
+        similarity, extent_length, lower, count = tmp_similarity, tmp_extent_length, tmp_lower, tmp_count
+      tmp_trigram = document_trigrams[tmp_lower]
+      if last_positions.get(tmp_trigram, -1) == tmp_lower:
+        tmp_extent_length -= 1
+        tmp_count -= tmp_trigram in query_trigrams
+    best = max(best, similarity)
+    for tmp_lower in range(previous_lower, lower):
+      tmp_trigram = document_trigrams[tmp_lower]
+      if last_positions.get(tmp_trigram, -1) == tmp_lower:
+        last_positions[tmp_trigram] = -1
+  return best
+
+class WordSimilarity(Func):
+  function = 'WORD_SIMILARITY'
+  output_field = FloatField()
+
+# search_document__word_similar=query -> search_document %> query (ie. WORD_SIMILARITY(query, search_document) >= threshold)
+@models.CharField.register_lookup
+@models.TextField.register_lookup
+class WordSimilar(Lookup):
+  lookup_name = 'word_similar'
+
+  def as_sql(self, compiler, connection):
+    lhs, lhs_params = self.process_lhs(compiler, connection)
+    rhs, rhs_params = self.process_rhs(compiler, connection)
+    return f'{lhs} %%> {rhs}', lhs_params + rhs_params
+
+# {field: query} of the terms with words in them, normalized, eg. search_terms(brand='Good-Year', tire_type=' ') -> {'brand': 'good year'}
+def search_terms(**terms):
+  return {field: ' '.join(words(query)) for field, query in terms.items() if words(query)}
+
+# {value: rank} of the values matching the query (rank between 0 and 1, higher is closer)
+def match_values(query, values):
+  ranks = {}
+  for value in values:
+    rank = word_similarity(query, value)
+    if rank >= WORD_SIMILARITY_THRESHOLD:
+      ranks[value] = rank
+  return ranks
+
+# Filters the queryset to the tires matching every term and annotates their search_rank (the average rank of the terms)
+# query is matched against search_document, the keyword terms against their field, eg. search_tires(tires, brand='michelin')
+def search_tires(queryset, query='', **terms):
+  terms = search_terms(**{'search_document': query, **terms})
+  if not terms:
+    return queryset.none()
+  ranks = []
+  if connections[queryset.db].vendor == 'postgresql':
+    for field, query in terms.items():
+      queryset = queryset.filter(**{f'{field}__word_similar': query})
+      ranks.append(WordSimilarity(Value(query), F(field)))
+  else: # The distinct values of each field are ranked with word_similarity(), then matched with IN
+    for field, query in terms.items():
+      values = match_values(query, queryset.order_by().values_list(field, flat=True).distinct())
+      queryset = queryset.filter(**{f'{field}__in': values})
+      ranks.append(Case(*[When(**{field: value}, then=Value(rank)) for value, rank in values.items()], default=Value(0.0), output_field=FloatField()))
+  return queryset.annotate(search_rank=ExpressionWrapper(sum(ranks[1:], ranks[0]) / Value(float(len(ranks))), output_field=FloatField()))
@@ -1,12 +1,37 @@
-import os
-from django.core.mail import send_mail, mail_admins, EmailMultiAlternatives
 from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.template import loader
-from django.utils import timezone
-from email.mime.image import MIMEImage
-from .models import CartDetail, Cart, OrderShipping, Tire
 from django.utils import timezone
+from .models import CartDetail, Cart, OrderShipping, Tire, Tread, Stock, ProductInventory, invalidate_tire_lookups
+from .search import build_search_document
+from .catalog import refresh_catalog_products_on_commit, bump_catalog_generation_on_commit
+from .context_processors import invalidate_cart_badge
+from .outbox import queue_mail
+from .emails import order_context, render_invoice_email
+
+# Deleting a Stock row (including bulk deletes from the admin) reverses it on the ProductInventory counters
+# post_delete is sent inside the deletion's transaction, so the counters are updated atomically with the delete
+@receiver(post_delete, sender=Stock)
+def reverse_stock_inventory(sender, instance, *args, **kwargs):
+  ProductInventory.record_stock(instance.product_id, instance.quantity_change_type, -instance.quantity_change_value, create=False)
+
+# Stock changes move to a new catalog generation, so that results showing stock aren't served from the cache
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def bump_stock_catalog_generation(sender, instance, *args, **kwargs):
+  bump_catalog_generation_on_commit()
+
+# Removing an item from a fulfilled cart takes it back out of the sold online counter
+# NOTE: Must be registered before delete_empty_cart, which can change the cart's status
+@receiver(post_delete, sender=CartDetail)
+def reverse_cart_detail_inventory(sender, instance, *args, **kwargs):
+  if instance.cart.status == Cart.Status.FULFILLED:
+    ProductInventory.apply(instance.product_id, create=False, sold_online_quantity=-instance.quantity)
+
+# Removing an item from a placed order recomputes the totals frozen on the Cart
+@receiver(post_delete, sender=CartDetail)
+def refresh_frozen_cart_totals(sender, instance, *args, **kwargs):
+  if instance.cart.is_frozen:
+    instance.cart.refresh_frozen_totals()
 
 # After a CartDetail is deleted, if the Cart no longer has CartDetail objects associated with it (ie. the Cart is now empty), mark the Cart as 'ABANDONED'
 @receiver(post_delete, sender=CartDetail)
@@ -16,6 +41,23 @@ def delete_empty_cart(sender, instance, *args, **kwargs):
     cart.status = cart.Status.ABANDONED
     cart.save()
 
+# The cart badge of the user (see context_processors.py) shows the number of items of their current cart
+@receiver(post_save, sender=CartDetail)
+@receiver(post_delete, sender=CartDetail)
+def invalidate_cart_detail_badge(sender, instance, *args, **kwargs):
+  # The user of the cart is read from the cart loaded with the item if there is one, without fetching the whole Cart otherwise
+  if CartDetail.cart.is_cached(instance):
+    user_id = instance.cart.user_id
+  else:
+    user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+  if user_id is not None:
+    invalidate_cart_badge(user_id)
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def invalidate_current_cart_badge(sender, instance, *args, **kwargs):
+  invalidate_cart_badge(instance.user_id)
+
 @receiver(pre_save, sender=Cart)
 def update_cart_time_metadata(sender, instance, *args, **kwargs):
   if instance.status_tracker.has_changed('status'):
@@ -40,34 +82,16 @@ def update_cart_time_metadata(sender, instance, *args, **kwargs):
 @receiver(post_save, sender=Cart)
 def send_order_fulfilled_email(sender, instance, *args, **kwargs):
   if instance.status_tracker.has_changed('status') and instance.status == Cart.Status.FULFILLED:
-    order = instance.ordershipping
-    cart_details = order.cart.cartdetail_set.all()
     #Info needed to send user email
     email = instance.user.email
-    subject = f"Roadstar Tire Wholesale Order # {order.id} was shipped"
-    message = f"Your order has been shipped and an invoice will be provided on delivery. Please log into your account to view details."
-    html_message = loader.render_to_string(
-      'email/invoice_email.html',
-      { 'order': order,
-        'user': instance.user,
-        'cart_details': cart_details
-      })
-    msg = EmailMultiAlternatives(
+    subject, message, html_message = render_invoice_email(order_context(instance.ordershipping, instance.user))
+    queue_mail(
       subject, 
       message, 
-      'settings.EMAIL_HOST_USER', 
-      [email]
+      [email], 
+      html_message=html_message,
+      attach_logo=True # Shown by the invoice
     )
-    msg.attach_alternative(html_message, "text/html")
-    msg.mixed_subtype = 'related'
-    f = 'static/images/road-star-logo.png'
-    fp = open(os.path.join(os.path.dirname(__file__), f), 'rb')
-    msg_img = MIMEImage(fp.read())
-    fp.close()
-    msg_img.add_header('Content-ID', '<{}>'.format(f))
-    msg.attach(msg_img)
-    print(msg_img.get_filename())
-    msg.send()
 
 # When an order is placed, create a OrderShipping object that saves the user's current shipping info defined on their profile
 @receiver(post_save, sender=Cart)
@@ -94,8 +118,34 @@ def create_order_shipping(sender, instance, *args, **kwargs):
 def update_updated_to(sender, instance, *args, **kwargs):
   if instance.inherits_from: # If beyond the first Tire version
     Tire.objects.all().filter(id=instance.inherits_from.id).update(updated_to=instance)
+    bump_catalog_generation_on_commit() # The previous version left the catalog
 
 @receiver(post_save, sender=Tire)
 def update_date_effective(sender, instance, *args, **kwargs):
   if not instance.date_effective_tracker.has_changed('date_effective'):
-    Tire.objects.all().filter(pk=instance.pk).update(date_effective = timezone.now())
\ No newline at end of file
+    Tire.objects.all().filter(pk=instance.pk).update(date_effective = timezone.now())
+    bump_catalog_generation_on_commit() # Can change which version is effective
+
+# Keep Product.current_tire pointing at the effective version, and discard the memoized Tire lookups of that product
+# NOTE: Must be registered after update_date_effective, which can change the date_effective in the database
+@receiver(post_save, sender=Tire)
+@receiver(post_delete, sender=Tire)
+def update_product_current_tire(sender, instance, *args, **kwargs):
+  invalidate_tire_lookups(instance.product_id)
+  instance.product.refresh_current_tire()
+
+# The tread name is part of the search document of its tires
+@receiver(post_save, sender=Tread)
+def update_tread_search_documents(sender, instance, *args, **kwargs):
+  product_ids = set()
+  for tire in instance.tire_set.select_related('tread'):
+    Tire.objects.filter(pk=tire.pk).update(search_document=build_search_document(tire))
+    product_ids.add(tire.product_id)
+  refresh_catalog_products_on_commit(product_ids)
+
+# Refresh the product in the catalog index of every worker and move to a new catalog generation once the change is committed (see catalog.py)
+# NOTE: Must be registered after update_updated_to, which retires the previous version
+@receiver(post_save, sender=Tire)
+@receiver(post_delete, sender=Tire)
+def refresh_catalog_index(sender, instance, *args, **kwargs):
+  refresh_catalog_products_on_commit([instance.product_id])
@@ -0,0 +1,137 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+"""
+Parsing of tire sizes (eg. 215/55R17, LT265/70R17, 31x10.50R15)
+
+Tire.width, Tire.aspect_ratio and Tire.rim_size are free-form CharFields entered in the admin, so they are parsed into
+the numeric size_* columns on save (see Tire.save). Searches filter on those columns instead of the text (icontains
+on '55' also matches '255'). The overall diameter computed from them is stored as well, so equivalent sizes are found
+with a range scan (see equivalent_lookups)
+"""
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_LETTERS = re.compile(r'^\s*([A-Za-z]+)')
+
+# Service type (P, LT, ST, T) is written before the width, construction (R, ZR, D, B) before the rim diameter
+SERVICE_TYPES = ('P', 'LT', 'ST', 'T')
+CONSTRUCTIONS = ('R', 'ZR', 'D', 'B')
+
+MM_PER_INCH = Decimal('25.4')
+
+# Sizes whose overall diameter is within this share of the requested one are offered as equivalents (see equivalent_lookups)
+EQUIVALENT_DIAMETER_TOLERANCE = Decimal('0.03')
+MAX_EQUIVALENT_DIAMETER_TOLERANCE = Decimal('0.10')
+
+# First number in the value (eg. 'LT265' -> 265, '10.50' -> 10.50), None when there isn't one or it isn't a plausible size
+def parse_dimension(value):
+  match = _NUMBER.search(str(value or ''))
+  if not match:
+    return None
+  try:
+    number = Decimal(match.group()).quantize(Decimal('0.01'))
+  except InvalidOperation:
+    return None
+  return number if number < 1000 else None # Fits the size_* columns
+
+# Leading letters of the value when they are one of the choices (eg. 'ZR17' -> 'ZR'), '' otherwise
+def parse_prefix(value, choices):
+  match = _LETTERS.match(str(value or ''))
+  if match and match.group(1).upper() in choices:
+    return match.group(1).upper()
+  return ''
+
+# Values of the Tire.size_* columns
+def parse_tire_size(width, aspect_ratio, rim_size):
+  return {
+    'size_width': parse_dimension(width),
+    'size_aspect_ratio': parse_dimension(aspect_ratio),
+    'size_rim_diameter': parse_dimension(rim_size),
+    'size_service_type': parse_prefix(width, SERVICE_TYPES),
+    'size_construction': parse_prefix(rim_size, CONSTRUCTIONS),
+  }
+
+# Overall diameter in inches, the rim diameter plus two sidewalls of width * aspect ratio (eg. 215/55R17 -> 26.31)
+# Flotation sizes (eg. 31x10.50R15) are written in inches and start with the overall diameter
+def overall_diameter(width, aspect_ratio, rim_diameter):
+  if width is None or rim_diameter is None:
+    return None
+  if width < 100:
+    return width
+  if aspect_ratio is None:
+    return None
+  return (rim_diameter + 2 * width * aspect_ratio / 100 / MM_PER_INCH).quantize(Decimal('0.01'))
+
+def _format_dimension(value):
+  return f'{value.normalize():f}' if value is not None else ''
+
+# Size as written on the tire (eg. LT265/70R17), from the values of the size_* columns
+def format_size(service_type, width, aspect_ratio, rim_diameter, construction):
+  size = f'{service_type or ""}{_format_dimension(width)}'
+  if aspect_ratio is not None:
+    size += f'/{_format_dimension(aspect_ratio)}'
+  if rim_diameter is not None:
+    size += f'{construction or "R"}{_format_dimension(rim_diameter)}'
+  return size
+
+# Turns a quick search (eg. '215/55R17', '215 55 17', '2155517', '21555') into size_* lookups
+# Separated numbers are matched exactly, a run of digits is split as 3 (width) / 2 (aspect ratio) / 2 (rim diameter)
+# and a truncated part becomes a range (eg. '22' -> 220 <= width < 230)
+def quick_search_lookups(query):
+  numbers = _NUMBER.findall(query or '')
+  lookups = {}
+  service_type = parse_prefix(query, SERVICE_TYPES)
+  if service_type:
+    lookups['size_service_type'] = service_type
+  if len(numbers) > 1:
+    for field, number in zip(('size_width', 'size_aspect_ratio', 'size_rim_diameter'), numbers):
+      lookups[field] = Decimal(number)
+    return lookups
+  digits = re.sub(r'\D', '', query or '')
+  for field, start, length in (('size_width', 0, 3), ('size_aspect_ratio', 3, 2), ('size_rim_diameter', 5, 2)):
+    part = digits[start:start + length]
+    if not part:
+      break
+    if len(part) == length:
+      lookups[field] = Decimal(part)
+    else:
+      scale = 10 ** (length - len(part))
+      lookups[f'{field}__gte'] = int(part) * scale
+      lookups[f'{field}__lt'] = (int(part) + 1) * scale
+  return lookups
+
+# Turns a complete size (eg. '215/55R17') into a size_overall_diameter range of +/- tolerance (a share, eg. 0.03)
+# Returns None when the query isn't a complete size (eg. '215/55')
+def equivalent_lookups(query, tolerance=EQUIVALENT_DIAMETER_TOLERANCE):
+  lookups = quick_search_lookups(query)
+  diameter = overall_diameter(lookups.get('size_width'), lookups.get('size_aspect_ratio'), lookups.get('size_rim_diameter'))
+  if diameter is None:
+    return None
+  return {
+    'size_overall_diameter__gte': (diameter * (1 - tolerance)).quantize(Decimal('0.01')),
+    'size_overall_diameter__lte': (diameter * (1 + tolerance)).quantize(Decimal('0.01')),
+  }
+
+# Tolerance given in percent (eg. ?tolerance=3 -> 0.03), the default one when it is missing or out of bounds
+def parse_tolerance(value):
+  try:
+    tolerance = Decimal(value) / 100
+  except (TypeError, InvalidOperation):
+    return EQUIVALENT_DIAMETER_TOLERANCE
+  return tolerance if 0 <= tolerance <= MAX_EQUIVALENT_DIAMETER_TOLERANCE else EQUIVALENT_DIAMETER_TOLERANCE
+
+# Turns the detailed search inputs into size_* lookups, falling back to the text columns for inputs that aren't sizes
+def size_lookups(width, aspect_ratio, rim_size):
+  lookups = {}
+  for field, value in (('width', width), ('aspect_ratio', aspect_ratio), ('rim_size', rim_size)):
+    if not value:
+      continue
+    number = parse_dimension(value)
+    if number is None:
+      lookups[f'{field}__icontains'] = value
+    else:
+      lookups['size_rim_diameter' if field == 'rim_size' else f'size_{field}'] = number
+  service_type = parse_prefix(width, SERVICE_TYPES)
+  if service_type:
+    lookups['size_service_type'] = service_type
+  return lookups
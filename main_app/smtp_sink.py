@@ -0,0 +1,98 @@
+"""
+In-process SMTP server that accepts every email and keeps it in memory (nothing is relayed)
+
+Used by the benchmark_email_throughput command to deliver the emails on localhost instead of Gmail:
+  with SMTPSink() as sink:
+    # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST = sink.host, EMAIL_PORT = sink.port
+    ...
+  sink.messages # [(mail_from, [recipients], data bytes)]
+
+It speaks the subset of SMTP that smtplib (and so Django's SMTP backend) uses without TLS or authentication
+(it is built on socketserver rather than aiosmtpd or the smtpd module, which is removed in Python 3.12, to not add a dependency)
+"""
+
+import socketserver
+import threading
+
+class SMTPSink:
+  def __init__(self, host='127.0.0.1', port=0): # Port 0: any free port
+    self.messages = []
+    self.server = _SMTPServer((host, port), _SMTPHandler)
+    self.server.sink = self
+    self.thread = threading.Thread(target=self.server.serve_forever, name='smtp-sink', daemon=True)
+
+  @property
+  def host(self):
+    return self.server.server_address[0]
+
+  @property
+  def port(self):
+    return self.server.server_address[1]
+
+  def start(self):
+    self.thread.start()
+    return self
+
+  def stop(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc_info):
+    self.stop()
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+  def handle(self):
+    self.reply('220 localhost SMTP sink')
+    mail_from, recipients = None, []
+    while True:
+      line = self.rfile.readline()
+      if not line:
+        return
+      command = line.decode('utf-8', 'replace').rstrip('\r\n')
+      verb, _, argument = command.partition(' ')
+      verb = verb.upper()
+      if verb == 'EHLO':
+        self.reply('250-localhost', '250-8BITMIME', '250 SMTPUTF8')
+      elif verb in ('HELO', 'NOOP'):
+        self.reply('250 OK')
+      elif verb == 'MAIL':
+        mail_from, recipients = argument[len('FROM:'):].split(' ')[0].strip('<>'), []
+        self.reply('250 OK')
+      elif verb == 'RCPT':
+        recipients.append(argument[len('TO:'):].split(' ')[0].strip('<>'))
+        self.reply('250 OK')
+      elif verb == 'DATA':
+        if not recipients:
+          self.reply('503 RCPT first')
+          continue
+        self.reply('354 End data with <CR><LF>.<CR><LF>')
+        self.server.sink.messages.append((mail_from, recipients, self.read_data()))
+        mail_from, recipients = None, []
+        self.reply('250 OK')
+      elif verb == 'RSET':
+        mail_from, recipients = None, []
+        self.reply('250 OK')
+      elif verb == 'QUIT':
+        self.reply('221 Bye')
+        return
+      else:
+        self.reply('502 Command not implemented')
+
+  # The lines up to the one with a single dot, with the leading dot of the other lines removed (RFC 5321 4.5.2)
+  def read_data(self):
+    lines = []
+    for line in iter(self.rfile.readline, b''):
+      if line in (b'.\r\n', b'.\n'):
+        break
+      lines.append(line[1:] if line.startswith(b'.') else line)
+    return b''.join(lines)
+
+  def reply(self, *lines):
+    self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode())
@@ -39,4 +39,40 @@ window.onload = function() {
       });
     });
   });
+
+  // Quick search typeahead, suggests the sizes of the catalog starting with what was typed
+  const quickSearch = document.querySelector('#id_q[data-suggestions-url]');
+  if (quickSearch) {
+    const suggestions = document.getElementById('size-suggestions');
+    let timer = null;
+    let lastQuery = null;
+
+    quickSearch.addEventListener('input', () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => {
+        const query = quickSearch.value.trim();
+        if (!/\d/.test(query) || query === lastQuery) {
+          return;
+        }
+        lastQuery = query;
+        fetch(`${quickSearch.dataset.suggestionsUrl}?q=${encodeURIComponent(query)}`, {
+          "headers": {"accept": "application/json"},
+          "credentials": "include"
+        }).then(response => response.json()).then(data => {
+          if (data.query !== quickSearch.value.trim()) {
+            return; // A newer query was typed in the meantime
+          }
+          suggestions.innerHTML = '';
+          data.sizes.forEach(s => {
+            const option = document.createElement('option');
+            option.value = s.size;
+            option.label = `${s.count} tire${s.count === 1 ? '' : 's'}`;
+            suggestions.appendChild(option);
+          });
+        }).catch((error) => {
+          console.error('Error:', error);
+        });
+      }, 150);
+    });
+  }
 }
@@ -0,0 +1,18 @@
+from decimal import Decimal
+from django.db import connection
+from main_app.models import Product, Tire
+from users.models import CustomUser
+
+# A product with a single Tire version, in effect
+def create_tire(brand='Michelin', width='215', price=100, **fields):
+  fields = {'aspect_ratio': '55', 'rim_size': 'R17', **fields}
+  return Tire.objects.create(product=Product.objects.create(), brand=brand, width=width, price=Decimal(price), **fields)
+
+def create_customer(email='customer@example.com'):
+  return CustomUser.objects.create_user(email, 'password', is_active=True)
+
+# TestCase never commits, run what is waiting for the commit instead
+def run_on_commit():
+  callbacks, connection.run_on_commit = connection.run_on_commit, []
+  for savepoint_ids, func in callbacks:
+    func()
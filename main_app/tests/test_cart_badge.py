@@ -0,0 +1,42 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from main_app.models import Cart, CartDetail
+from users.models import CustomUser
+from . import create_customer, create_tire
+
+class CartBadgeTests(TestCase):
+  def setUp(self):
+    caches['default'].clear()
+    self.user = create_customer()
+    self.cart = Cart.objects.create(user=self.user, status=Cart.Status.CURRENT)
+    CartDetail.objects.create(cart=self.cart, product=create_tire().product, quantity=2)
+    self.client.force_login(self.user)
+
+  def assertBadge(self, item_count):
+    self.assertContains(self.client.get('/contact/'), f'<span class="cart-badge">{item_count}</span>', count=2)
+
+  # Once cached, the badge doesn't cost any query
+  def test_cached(self):
+    self.assertBadge(1)
+    with CaptureQueriesContext(connection) as queries:
+      self.assertBadge(1)
+    self.assertFalse([query for query in queries if 'main_app_cart' in query['sql']])
+
+  def test_cart_changes(self):
+    self.assertBadge(1)
+    CartDetail.objects.create(cart=self.cart, product=create_tire(brand='Goodyear').product, quantity=1)
+    self.assertBadge(2)
+    self.cart.status = Cart.Status.IN_PROGRESS
+    self.cart.save()
+    self.assertNotContains(self.client.get('/contact/'), 'cart-badge">')
+
+  # Saving a user loaded before a change to their carts doesn't take the version back
+  def test_user_save_keeps_version(self):
+    user = CustomUser.objects.get(pk=self.user.pk)
+    CartDetail.objects.create(cart=self.cart, product=create_tire(brand='Goodyear').product, quantity=1)
+    version = CustomUser.objects.get(pk=self.user.pk).cart_badge_version
+    user.first_name = 'Jo'
+    user.save()
+    self.assertGreaterEqual(CustomUser.objects.get(pk=self.user.pk).cart_badge_version, version)
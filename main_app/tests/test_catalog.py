@@ -0,0 +1,75 @@
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from main_app import catalog
+from main_app.catalog import bump_catalog_generation, bump_catalog_generation_on_commit, get_catalog_generation, get_catalog_index
+from main_app.facets import search_facets
+from main_app.models import CatalogCounter, Stock
+from . import create_tire, run_on_commit
+
+class CatalogGenerationTests(TestCase):
+  def test_bump(self):
+    generation = get_catalog_generation()
+    self.assertEqual(bump_catalog_generation(), generation + 1)
+    self.assertEqual(get_catalog_generation(), generation + 1)
+    self.assertEqual(CatalogCounter.objects.get(name=catalog.CATALOG_GENERATION).value, generation + 1)
+
+  def test_bump_missing(self):
+    CatalogCounter.objects.all().delete()
+    generation = bump_catalog_generation()
+    self.assertEqual(get_catalog_generation(), generation)
+
+  def test_bump_on_commit_once_per_transaction(self):
+    generation = get_catalog_generation()
+    bump_catalog_generation_on_commit()
+    bump_catalog_generation_on_commit()
+    self.assertEqual(sum(1 for savepoint_ids, func in connection.run_on_commit if isinstance(func, catalog.CatalogChanges)), 1)
+    run_on_commit()
+    self.assertEqual(get_catalog_generation(), generation + 1)
+
+class CatalogIndexTests(TestCase):
+  def setUp(self):
+    catalog._index = None
+    caches['default'].clear()
+    caches['shared'].clear()
+    self.tire = create_tire(brand='Michelin', width='215')
+    run_on_commit()
+
+  def test_stock_keeps_index(self):
+    index = get_catalog_index()
+    version, generation = index.version, get_catalog_generation()
+    Stock.objects.create(product=self.tire.product, quantity_change_value=10)
+    run_on_commit()
+    self.assertGreater(get_catalog_generation(), generation)
+    self.assertIs(get_catalog_index(), index)
+    self.assertEqual(index.version, version)
+
+  # Tires saved by any worker are refreshed in the index, without building it again
+  def test_tire_refreshes_index(self):
+    index = get_catalog_index()
+    version = index.version
+    other = create_tire(brand='Goodyear', width='225')
+    self.tire.price = 80
+    self.tire.save()
+    run_on_commit()
+    self.assertIs(get_catalog_index(), index)
+    self.assertEqual(index.version, version + 1)
+    self.assertEqual(set(index.search(terms={'brand': 'goodyear'})), {other.pk})
+    self.assertEqual(index.entries[self.tire.pk].price, 80)
+
+  # The changes are only kept INDEX_CHANGE_TIMEOUT, after that the index is built again
+  def test_rebuild_without_changes(self):
+    index = get_catalog_index()
+    create_tire(brand='Goodyear')
+    run_on_commit()
+    caches['shared'].clear()
+    self.assertIsNot(get_catalog_index(), index)
+    self.assertEqual(len(get_catalog_index().entries), 2)
+
+  # Facets are cached per generation, so they are counted again after any change to the catalog
+  def test_facets_invalidated(self):
+    self.assertEqual(search_facets({})[0], ('Brand', [('Michelin', 1)]))
+    create_tire(brand='Goodyear')
+    self.assertEqual(search_facets({})[0], ('Brand', [('Michelin', 1)]))
+    run_on_commit()
+    self.assertEqual(search_facets({})[0], ('Brand', [('Goodyear', 1), ('Michelin', 1)]))
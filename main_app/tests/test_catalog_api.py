@@ -0,0 +1,49 @@
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from main_app.catalog import bump_catalog_generation
+from main_app.models import Stock, Tire
+from . import create_customer, create_tire, run_on_commit
+
+class CatalogApiTests(TestCase):
+  def setUp(self):
+    self.tire = create_tire(brand='Michelin', rim_size='R17')
+    create_tire(brand='Goodyear', rim_size='R18')
+    self.client.force_login(create_customer())
+
+  def test_results(self):
+    response = self.client.get('/api/v1/tires/', {'rim_size': '17'})
+    self.assertEqual([tire['brand'] for tire in response.json()['results']], ['Michelin'])
+    self.assertEqual(self.client.get('/api/v1/tires/', {'brand': 'goodyeer'}).json()['results'][0]['brand'], 'Goodyear')
+
+  # A poll sending the ETag back only reads the session, the user and the generation
+  def test_not_modified(self):
+    etag = self.client.get('/api/v1/tires/', {'rim_size': '17'})['ETag']
+    with self.assertNumQueries(3):
+      response = self.client.get('/api/v1/tires/', {'rim_size': '17'}, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 304)
+    self.assertNotEqual(self.client.get('/api/v1/tires/', {'rim_size': '18'})['ETag'], etag)
+
+  def test_modified(self):
+    etag = self.client.get('/api/v1/tires/')['ETag']
+    Stock.objects.create(product=self.tire.product, quantity_change_value=10)
+    bump_catalog_generation() # What the commit of the stock change does
+    response = self.client.get('/api/v1/tires/', HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertNotEqual(response['ETag'], etag)
+
+  # An upcoming price is listed once promote_tires brings it into effect
+  def test_promoted_version(self):
+    upcoming = Tire.objects.create(product=self.tire.product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=80, inherits_from=self.tire, date_effective=timezone.now() + timedelta(days=1))
+    Tire.objects.filter(pk=upcoming.pk).update(date_effective=timezone.now() + timedelta(days=1))
+    self.tire.product.refresh_current_tire()
+    response = self.client.get('/api/v1/tires/', {'rim_size': '17'})
+    self.assertEqual(response.json()['results'][0]['price'], '100.00')
+    Tire.objects.filter(pk=upcoming.pk).update(date_effective=timezone.now())
+    call_command('promote_tires', stdout=StringIO())
+    run_on_commit()
+    response = self.client.get('/api/v1/tires/', {'rim_size': '17'}, HTTP_IF_NONE_MATCH=response['ETag'])
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['results'][0]['price'], '80.00')
@@ -0,0 +1,48 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from main_app.models import Cart, CartDetail, Product, Tire
+from . import create_customer, create_tire
+
+class UpdatedTireTests(TestCase):
+  # Versions aren't necessarily entered in chronological order: the item follows date_effective, the product the newest entry
+  def test_cart_detail_follows_date_effective(self):
+    now = timezone.now()
+    first = create_tire()
+    product = first.product
+    Tire.objects.filter(pk=first.pk).update(date_effective=now - datetime.timedelta(days=1))
+    backdated = Tire.objects.create(product=product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=Decimal('90'), date_effective=now - datetime.timedelta(days=2))
+    Tire.objects.filter(pk=backdated.pk).update(date_effective=now - datetime.timedelta(days=2))
+    user = create_customer()
+    item = CartDetail(cart=Cart.objects.create(user=user, status=Cart.Status.CURRENT), product=Product.objects.get(pk=product.pk), quantity=1)
+    self.assertEqual(item.get_updated_tire(), first)
+
+class PromotionTests(TestCase):
+  def setUp(self):
+    self.first = create_tire(price=100)
+    self.product = self.first.product
+    upcoming = Tire.objects.create(product=self.product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=Decimal('80'), inherits_from=self.first)
+    Tire.objects.filter(pk=upcoming.pk).update(date_effective=timezone.now() + datetime.timedelta(days=1))
+    self.product.refresh_current_tire()
+    self.upcoming = Tire.objects.get(pk=upcoming.pk)
+
+  def test_upcoming_version_not_current(self):
+    self.assertEqual(Product.objects.get(pk=self.product.pk).current_tire, self.first)
+    self.assertFalse(Product.objects.needing_promotion().exists())
+    self.assertEqual(Product.objects.promote_tires(), 0)
+
+  def test_promote_tires(self):
+    Tire.objects.filter(pk=self.upcoming.pk).update(date_effective=timezone.now())
+    self.assertEqual(list(Product.objects.needing_promotion()), [self.product])
+    self.assertEqual(Product.objects.promote_tires(), 1)
+    self.assertEqual(Product.objects.get(pk=self.product.pk).current_tire, self.upcoming)
+    self.assertEqual(Product.objects.promote_tires(), 0)
+
+  # The worker promotes the versions along with sending the outbox
+  def test_worker_promotes(self):
+    Tire.objects.filter(pk=self.upcoming.pk).update(date_effective=timezone.now())
+    call_command('send_outbox_emails', once=True, stdout=StringIO())
+    self.assertEqual(Product.objects.get(pk=self.product.pk).current_tire, self.upcoming)
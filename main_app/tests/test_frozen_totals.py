@@ -0,0 +1,53 @@
+from decimal import Decimal
+from django.test import TestCase
+from main_app.models import Cart, CartDetail, Tire
+from . import create_customer, create_tire
+
+class FrozenTotalsTests(TestCase):
+  def setUp(self):
+    self.tire = create_tire(price=100)
+    self.cart = Cart.objects.create(user=create_customer(), status=Cart.Status.CURRENT)
+    self.item = CartDetail.objects.create(cart=self.cart, product=self.tire.product, quantity=2)
+
+  def place_order(self):
+    self.cart.status = Cart.Status.IN_PROGRESS
+    self.cart.save()
+
+  def new_price(self, price):
+    Tire.objects.create(product=self.tire.product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=Decimal(price), inherits_from=Tire.objects.get(product=self.tire.product, updated_to=None))
+
+  # A price change after the order is placed doesn't change it
+  def test_price_change(self):
+    self.place_order()
+    self.new_price(150)
+    cart = Cart.objects.get(pk=self.cart.pk)
+    self.assertTrue(cart.is_frozen)
+    self.assertEqual((cart.get_item_count(), cart.get_subtotal(), cart.get_total()), (1, Decimal('200.00'), Decimal('226.00')))
+    item = CartDetail.objects.get(pk=self.item.pk)
+    self.assertEqual((item.ordered_tire, item.price, item.get_subtotal()), (self.tire, Decimal('100.00'), Decimal('200.00')))
+    self.assertEqual(Cart.objects.with_pricing().get(pk=self.cart.pk).pricing_total, Decimal('226.00'))
+
+  # Changes made to the placed order itself (eg. from the admin) are reflected, still at the price ordered
+  def test_order_changes(self):
+    self.place_order()
+    self.new_price(150)
+    item = CartDetail.objects.get(pk=self.item.pk)
+    item.quantity = 3
+    item.save()
+    self.assertEqual(Cart.objects.get(pk=self.cart.pk).get_subtotal(), Decimal('300.00'))
+    cart = Cart.objects.get(pk=self.cart.pk)
+    cart.discount_percent_applied = Decimal('10')
+    cart.save()
+    self.assertEqual(Cart.objects.get(pk=self.cart.pk).get_total(), Decimal('305.10'))
+
+  # Reopening the order unfreezes it, its items are priced at their relevant Tire version again
+  def test_reopened(self):
+    self.place_order()
+    self.new_price(150)
+    cart = Cart.objects.get(pk=self.cart.pk)
+    cart.status = Cart.Status.CURRENT
+    cart.save()
+    cart = Cart.objects.get(pk=self.cart.pk)
+    self.assertFalse(cart.is_frozen)
+    self.assertEqual(CartDetail.objects.get(pk=self.item.pk).ordered_tire, None)
+    self.assertEqual(cart.get_subtotal(), Decimal('200.00'))
@@ -0,0 +1,78 @@
+from django.test import TestCase
+from main_app.models import Cart, CartDetail, Product, ProductInventory, Stock, Tire
+from . import create_customer, create_tire
+
+class InventoryCounterTests(TestCase):
+  def setUp(self):
+    self.product = create_tire().product
+    self.user = create_customer()
+
+  def assertCounters(self, received=0, sold_online=0, sold_offline=0, shrink=0):
+    product = Product.objects.get(pk=self.product.pk)
+    self.assertEqual(
+      (product.total_quantity, product.sold_online_quantity, product.sold_offline_quantity, product.shrink_quantity),
+      (received, sold_online, sold_offline, shrink),
+    )
+
+  def test_stock(self):
+    received = Stock.objects.create(product=self.product, quantity_change_value=50)
+    Stock.objects.create(product=self.product, quantity_change_type=Stock.SOLD, quantity_change_value=5)
+    shrink = Stock.objects.create(product=self.product, quantity_change_type=Stock.SHRINK, quantity_change_value=2)
+    self.assertCounters(received=50, sold_offline=5, shrink=2)
+    self.assertEqual(Product.objects.get(pk=self.product.pk).current_quantity, 43)
+    received.quantity_change_value = 40
+    received.save()
+    shrink.quantity_change_type = Stock.SOLD
+    shrink.save()
+    self.assertCounters(received=40, sold_offline=7)
+    Stock.objects.filter(pk=received.pk).delete() # Bulk deletes are reversed too
+    self.assertCounters(sold_offline=7)
+
+  # Only fulfilled orders count as sold online
+  def test_fulfilled_orders(self):
+    cart = Cart.objects.create(user=self.user, status=Cart.Status.CURRENT)
+    item = CartDetail.objects.create(cart=cart, product=self.product, quantity=4)
+    cart.status = Cart.Status.IN_PROGRESS
+    cart.save()
+    self.assertCounters()
+    cart.status = Cart.Status.FULFILLED
+    cart.save()
+    self.assertCounters(sold_online=4)
+    item.quantity = 6
+    item.save()
+    self.assertCounters(sold_online=6)
+    cart.status = Cart.Status.CANCELLED
+    cart.save()
+    self.assertCounters()
+
+  def test_rebuild(self):
+    Stock.objects.create(product=self.product, quantity_change_value=50)
+    ProductInventory.objects.update(received_quantity=999)
+    ProductInventory.rebuild()
+    self.assertCounters(received=50)
+
+class WithInventoryTests(TestCase):
+  def setUp(self):
+    self.untouched = create_tire().product
+    self.stocked = create_tire(brand='Goodyear').product
+    Stock.objects.create(product=self.stocked, quantity_change_value=30)
+    Stock.objects.create(product=self.stocked, quantity_change_type=Stock.SOLD, quantity_change_value=4)
+    Stock.objects.create(product=self.stocked, quantity_change_type=Stock.SHRINK, quantity_change_value=1)
+    self.never_received = create_tire(brand='Pirelli').product # Sold without any stock received, shown as 0 in stock
+    Stock.objects.create(product=self.never_received, quantity_change_type=Stock.SOLD, quantity_change_value=2)
+
+  # The annotations give the same figures as the properties, which then read them without querying the counters
+  def test_products(self):
+    fields = ('total_quantity', 'sold_online_quantity', 'sold_offline_quantity', 'sold_quantity', 'shrink_quantity', 'current_quantity')
+    for product in Product.objects.with_inventory():
+      expected = Product.objects.get(pk=product.pk)
+      expected_figures = [getattr(expected, field) for field in fields]
+      with self.assertNumQueries(0):
+        self.assertEqual([getattr(product, field) for field in fields], expected_figures, product)
+      self.assertEqual(product.inventory_sold_quantity, expected.sold_quantity)
+      self.assertEqual(product.inventory_current_quantity, expected.current_quantity)
+    self.assertEqual(Product.objects.with_inventory().get(pk=self.stocked.pk).current_quantity, 25)
+
+  def test_tires(self):
+    for tire in Tire.objects.with_inventory():
+      self.assertEqual(tire.inventory_current_quantity, Product.objects.get(pk=tire.product_id).current_quantity, tire)
@@ -0,0 +1,104 @@
+import datetime
+from unittest import mock
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from main_app.models import OutboxEmail
+from main_app.outbox import OUTBOX_MAX_ATTEMPTS, deliver, deliver_pending, queue_mail, retry_delay
+
+# Refuses the messages sent to a @bounce.test address, delivers the others to mail.outbox
+class BouncingEmailBackend(LocmemEmailBackend):
+  def send_messages(self, messages):
+    if any(address.endswith('@bounce.test') for message in messages for address in message.recipients()):
+      raise OSError('Recipient refused')
+    return super().send_messages(messages)
+
+# The mail server can't be reached
+class UnreachableEmailBackend(BaseEmailBackend):
+  def open(self):
+    raise ConnectionRefusedError('Connection refused')
+
+  def send_messages(self, messages):
+    raise AssertionError('Nothing is sent when the connection can not be opened')
+
+@override_settings(EMAIL_BACKEND='main_app.tests.test_outbox.BouncingEmailBackend')
+class OutboxTests(TestCase):
+  def test_retry_delay(self):
+    self.assertEqual(retry_delay(1), datetime.timedelta(seconds=30))
+    self.assertEqual(retry_delay(2), datetime.timedelta(seconds=60))
+    self.assertEqual(retry_delay(5), datetime.timedelta(seconds=480))
+    self.assertEqual(retry_delay(OUTBOX_MAX_ATTEMPTS), datetime.timedelta(hours=1)) # Capped at OUTBOX_MAX_RETRY_DELAY
+
+  def test_sent(self):
+    email = queue_mail('Order', 'Shipped', ['customer@example.com'])
+    self.assertEqual(deliver_pending(), (1, 0))
+    email.refresh_from_db()
+    self.assertEqual(email.status, OutboxEmail.Status.SENT)
+    self.assertEqual(email.attempts, 1)
+    self.assertIsNotNone(email.sent_at)
+    self.assertEqual(len(mail.outbox), 1)
+    self.assertEqual(deliver_pending(), (0, 0))
+
+  # Each email is sent on its own: a refused one is retried later, the others of the batch are sent
+  def test_failed_email_is_retried_with_backoff(self):
+    bounced = queue_mail('Order', 'Shipped', ['customer@bounce.test'])
+    sent = queue_mail('Order', 'Shipped', ['customer@example.com'])
+    before = timezone.now()
+    self.assertEqual(deliver_pending(), (1, 1))
+    bounced.refresh_from_db()
+    sent.refresh_from_db()
+    self.assertEqual(sent.status, OutboxEmail.Status.SENT)
+    self.assertEqual(bounced.status, OutboxEmail.Status.PENDING)
+    self.assertEqual(bounced.attempts, 1)
+    self.assertEqual(bounced.last_error, 'OSError: Recipient refused')
+    self.assertGreaterEqual(bounced.next_attempt_at, before + retry_delay(1))
+    # Not due again until the retry delay has passed
+    self.assertEqual(deliver_pending(), (0, 0))
+    OutboxEmail.objects.filter(pk=bounced.pk).update(next_attempt_at=timezone.now())
+    self.assertEqual(deliver_pending(), (0, 1))
+    bounced.refresh_from_db()
+    self.assertEqual(bounced.attempts, 2)
+    self.assertGreaterEqual(bounced.next_attempt_at, before + retry_delay(2))
+
+  def test_dead_letter(self):
+    email = queue_mail('Order', 'Shipped', ['customer@bounce.test'])
+    OutboxEmail.objects.filter(pk=email.pk).update(attempts=OUTBOX_MAX_ATTEMPTS - 1)
+    self.assertEqual(deliver_pending(), (0, 1))
+    email.refresh_from_db()
+    self.assertEqual(email.status, OutboxEmail.Status.FAILED)
+    self.assertEqual(email.attempts, OUTBOX_MAX_ATTEMPTS)
+    OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+    self.assertEqual(deliver_pending(), (0, 0))
+
+  # Opening the connection failed: it counts as an attempt for every email, and the next attempt is backed off
+  @override_settings(EMAIL_BACKEND='main_app.tests.test_outbox.UnreachableEmailBackend')
+  def test_connection_failure_counts_an_attempt(self):
+    emails = [queue_mail('Order', 'Shipped', [f'customer{i}@example.com']) for i in range(3)]
+    self.assertEqual(deliver_pending(), (0, 3))
+    for email in emails:
+      email.refresh_from_db()
+      self.assertEqual(email.status, OutboxEmail.Status.PENDING)
+      self.assertEqual(email.attempts, 1)
+      self.assertEqual(email.last_error, 'ConnectionRefusedError: Connection refused')
+      self.assertGreater(email.next_attempt_at, timezone.now())
+
+  # deliver() sends the given emails right away, whether they are due or not, but only those still pending
+  def test_deliver(self):
+    email = queue_mail('Order', 'Shipped', ['customer@example.com'])
+    OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now() + datetime.timedelta(hours=1))
+    self.assertEqual(deliver([email]), (1, []))
+    self.assertEqual(deliver([email]), (0, []))
+    self.assertEqual(len(mail.outbox), 1)
+
+  # The claim is recorded before anything is sent, so a worker that dies while sending doesn't lose the attempt
+  def test_attempt_recorded_before_sending(self):
+    email = queue_mail('Order', 'Shipped', ['customer@example.com'])
+    attempts = []
+    def send_messages(backend, messages):
+      attempts.append(OutboxEmail.objects.get(pk=email.pk).attempts)
+      return len(messages)
+    with mock.patch.object(BouncingEmailBackend, 'send_messages', send_messages):
+      deliver_pending()
+    self.assertEqual(attempts, [1])
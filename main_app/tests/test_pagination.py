@@ -0,0 +1,46 @@
+from decimal import Decimal
+from django.test import TestCase
+from main_app.models import Tire
+from main_app.pagination import KeysetPaginator, SequenceKeysetPaginator, decode_cursor, encode_cursor
+from . import create_tire
+
+class KeysetPaginationTests(TestCase):
+  @classmethod
+  def setUpTestData(cls):
+    # Ties on the price are broken by id
+    cls.tires = [create_tire(f'Brand {i}', str(195 + 10 * (i % 3)), 50 + 10 * (i // 2)) for i in range(7)]
+
+  def pages(self, paginator):
+    pages, cursor = [], None
+    while True:
+      page = paginator.get_page(cursor)
+      pages.append([tire.pk for tire in page])
+      if not page.has_next():
+        return pages, page
+      cursor = page.next_cursor
+
+  def test_cursor(self):
+    cursor = encode_cursor('price', 'next', (Decimal('50.00'), 3))
+    self.assertEqual(decode_cursor(cursor, 'price'), ('next', (Decimal('50.00'), 3)))
+    self.assertIsNone(decode_cursor(cursor, '-price')) # From another sort
+    self.assertIsNone(decode_cursor(cursor[:-2] + 'xx', 'price'))
+    self.assertIsNone(decode_cursor('not a cursor', 'price'))
+    self.assertIsNone(decode_cursor('', 'price'))
+
+  def test_queryset_pages(self):
+    expected = [tire.pk for tire in sorted(self.tires, key=lambda tire: (-tire.price, -tire.pk))]
+    pages, last_page = self.pages(KeysetPaginator(Tire.objects.all(), '-price', 3))
+    self.assertEqual(pages, [expected[0:3], expected[3:6], expected[6:]])
+    self.assertFalse(last_page.has_next())
+    previous = KeysetPaginator(Tire.objects.all(), '-price', 3).get_page(last_page.previous_cursor)
+    self.assertEqual([tire.pk for tire in previous], expected[3:6])
+    self.assertTrue(previous.has_previous())
+
+  # The catalog index pages through (value, id) keys, with the same cursors as the queryset
+  def test_sequence_pages(self):
+    tires = Tire.objects.in_bulk()
+    keys = sorted((tire.size_width, tire.pk) for tire in tires.values())
+    queryset_pages, _ = self.pages(KeysetPaginator(Tire.objects.all(), 'width', 3))
+    sequence_pages, last_page = self.pages(SequenceKeysetPaginator(keys, 'width', lambda ids: {pk: tires[pk] for pk in ids}, 3))
+    self.assertEqual(sequence_pages, queryset_pages)
+    self.assertEqual(SequenceKeysetPaginator(keys, 'width', tires.get, 3).count, 7)
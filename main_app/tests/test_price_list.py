@@ -0,0 +1,48 @@
+import json
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from main_app.models import Stock, Tire
+from . import create_customer, create_tire
+
+class PriceListTests(TestCase):
+  def setUp(self):
+    self.michelin = create_tire(brand='Michelin', price=100)
+    self.goodyear = create_tire(brand='Goodyear', width='225', price=90)
+    Tire.objects.update(date_effective=timezone.now() - timedelta(days=30))
+    self.client.force_login(create_customer())
+
+  def download(self, **params):
+    response = self.client.get('/api/v1/price-list/', {'format': 'ndjson', **params})
+    self.assertEqual(response.status_code, 200)
+    return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+  def test_csv(self):
+    response = self.client.get('/api/v1/price-list/')
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    self.assertEqual(lines[0], 'product_id,tire_id,size,brand,pattern,load_speed,tire_type,price,stock,date_effective')
+    self.assertEqual(len(lines), 3)
+    self.assertIn('X-Generated-At', response)
+
+  # Only the version in effect is listed, not the upcoming one
+  def test_versions(self):
+    Tire.objects.create(product=self.michelin.product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=80, inherits_from=self.michelin)
+    Tire.objects.create(product=self.goodyear.product, brand='Goodyear', width='225', aspect_ratio='55', rim_size='R17', price=70, inherits_from=self.goodyear, date_effective=timezone.now() + timedelta(days=1))
+    self.assertEqual({row['brand']: row['price'] for row in self.download()}, {'Michelin': '80.00', 'Goodyear': '90.00'})
+
+  # Delta mode: the new prices and the stock band changes since the previous download
+  def test_since(self):
+    since = timezone.now() - timedelta(days=1)
+    self.assertEqual(self.download(since=since.isoformat()), [])
+    Tire.objects.create(product=self.michelin.product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=80, inherits_from=self.michelin)
+    Stock.objects.create(product=self.goodyear.product, quantity_change_value=25)
+    rows = self.download(since=since.isoformat())
+    self.assertEqual({row['brand']: (row['price'], row['stock']) for row in rows}, {'Michelin': ('80.00', 'low'), 'Goodyear': ('90.00', 'high')})
+
+  def test_since_date(self):
+    Tire.objects.create(product=self.michelin.product, brand='Michelin', width='215', aspect_ratio='55', rim_size='R17', price=80, inherits_from=self.michelin)
+    self.assertEqual([row['brand'] for row in self.download(since=(timezone.localdate() - timedelta(days=1)).isoformat())], ['Michelin'])
+
+  def test_since_invalid(self):
+    for since in ('yesterday', '2026-13-01'):
+      self.assertEqual(self.client.get('/api/v1/price-list/', {'since': since}).status_code, 400, since)
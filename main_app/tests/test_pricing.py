@@ -0,0 +1,48 @@
+from decimal import Decimal
+from django.test import SimpleTestCase, TestCase
+from main_app.models import Cart, CartDetail
+from main_app.pricing import CartPricing
+from . import create_customer, create_tire
+
+# The original Cart.get_discount_amount(), get_tax_amount() and get_total(), from the subtotal
+def original_figures(subtotal, discount_percent, tax_percent):
+  discount_amount = round(subtotal * discount_percent / 100, 2)
+  tax_amount = round((subtotal - discount_amount) * tax_percent / 100, 2)
+  return subtotal, discount_amount, tax_amount, subtotal - discount_amount + tax_amount
+
+def figures(pricing):
+  return pricing.subtotal, pricing.discount_amount, pricing.tax_amount, pricing.total
+
+class CartPricingRoundingTests(SimpleTestCase):
+  # Includes amounts ending in half a cent, which round to the even cent like the original methods did
+  def test_same_as_original(self):
+    for subtotal in ('0.00', '100.00', '333.33', '12.50', '0.05', '1234.25'):
+      for discount_percent in ('0', '7.5', '10', '33.33', '100'):
+        for tax_percent in ('0', '13', '14.975', '5'):
+          subtotal_, discount_, tax_ = Decimal(subtotal), Decimal(discount_percent), Decimal(tax_percent)
+          self.assertEqual(figures(CartPricing.from_subtotal(1, subtotal_, discount_, tax_)), original_figures(subtotal_, discount_, tax_), (subtotal, discount_percent, tax_percent))
+
+  def test_empty_cart(self):
+    self.assertEqual(str(CartPricing.from_subtotal(0, None, Decimal('10'), Decimal('13')).subtotal), '0.00')
+
+class CartPricingTests(TestCase):
+  def setUp(self):
+    user = create_customer()
+    user.discount_percent = Decimal('7.5')
+    user.tax_percent = Decimal('13')
+    user.save()
+    self.cart = Cart.objects.create(user=user, status=Cart.Status.CURRENT)
+    CartDetail.objects.create(cart=self.cart, product=create_tire(price='99.99').product, quantity=3)
+    CartDetail.objects.create(cart=self.cart, product=create_tire(brand='Goodyear', price='45.55').product, quantity=1)
+
+  # The single aggregate query and the with_pricing() annotations give the original figures
+  def test_for_cart(self):
+    expected = original_figures(Decimal('99.99') * 3 + Decimal('45.55'), Decimal('7.5'), Decimal('13'))
+    cart = Cart.objects.get(pk=self.cart.pk)
+    with self.assertNumQueries(1):
+      self.assertEqual(figures(cart.pricing), expected)
+    self.assertEqual((cart.get_subtotal(), cart.get_discount_amount(), cart.get_tax_amount(), cart.get_total()), expected)
+    self.assertEqual(cart.get_item_count(), 2)
+    cart = Cart.objects.with_pricing().get(pk=self.cart.pk)
+    with self.assertNumQueries(0):
+      self.assertEqual(figures(cart.pricing), expected)
@@ -0,0 +1,46 @@
+from django.test import SimpleTestCase, TestCase
+from main_app.catalog import CatalogIndex
+from main_app.models import Tire
+from main_app.search import match_values, search_terms, word_similarity
+from . import create_tire
+
+class WordSimilarityTests(SimpleTestCase):
+  # Values returned by pg_trgm's word_similarity() for the same arguments
+  def test_word_similarity(self):
+    self.assertAlmostEqual(word_similarity('word', 'two words'), 0.8, places=6)
+    self.assertAlmostEqual(word_similarity('michelen', 'michelin p0 all season'), 2 / 3, places=6)
+    self.assertEqual(word_similarity('all season', 'p0 all season'), 1.0)
+    self.assertEqual(word_similarity('', 'michelin'), 0.0)
+    self.assertEqual(word_similarity('michelin', ''), 0.0)
+
+  def test_match_values(self):
+    self.assertEqual(set(match_values('goodyeer', ['goodyear', 'michelin', 'good'])), {'goodyear'})
+
+  def test_search_terms(self):
+    self.assertEqual(search_terms(brand='Good-Year', tire_type=' '), {'brand': 'good year'})
+
+class SearchTests(TestCase):
+  def setUp(self):
+    self.michelin = create_tire(brand='Michelin', pattern='Pilot Sport', tire_type='Summer')
+    self.goodyear = create_tire(brand='Goodyear', pattern='Ultra Grip', tire_type='Winter')
+
+  def test_typo(self):
+    self.assertEqual(list(Tire.objects.search('michelen')), [self.michelin])
+    self.assertEqual(list(Tire.objects.search('ultra grp')), [self.goodyear])
+    self.assertFalse(Tire.objects.search('bridgestone').exists())
+    self.assertFalse(Tire.objects.search('').exists())
+
+  def test_field_terms(self):
+    self.assertEqual(list(Tire.objects.search(brand='goodyer')), [self.goodyear])
+    self.assertFalse(Tire.objects.search(brand='michelin', tire_type='winter').exists())
+    self.assertEqual(list(Tire.objects.search('pilot', tire_type='summer')), [self.michelin])
+
+  def test_rank(self):
+    self.assertEqual(Tire.objects.search('michelin').get().search_rank, 1.0)
+    self.assertLess(Tire.objects.search('michelen').get().search_rank, 1.0)
+
+  # The catalog index answers tire_list searches, the ORM the rest, both must find the same tires
+  def test_index_matches_orm(self):
+    index = CatalogIndex.build()
+    for terms in ({'search_document': 'michelen'}, {'search_document': 'grip'}, {'brand': 'goodyer', 'tire_type': 'wintr'}, {'brand': 'pirelli'}):
+      self.assertEqual(set(index.search(terms=terms)), set(Tire.objects.search(**terms).values_list('pk', flat=True)), terms)
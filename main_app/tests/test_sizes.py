@@ -0,0 +1,55 @@
+from decimal import Decimal
+from django.test import SimpleTestCase, TestCase
+from main_app.models import Tire
+from main_app.sizes import equivalent_lookups, overall_diameter, parse_tire_size, parse_tolerance, quick_search_lookups, size_lookups
+from . import create_tire
+
+class SizeParsingTests(SimpleTestCase):
+  def test_parse_tire_size(self):
+    self.assertEqual(parse_tire_size('LT265', '70', 'R17'), {
+      'size_width': Decimal('265.00'),
+      'size_aspect_ratio': Decimal('70.00'),
+      'size_rim_diameter': Decimal('17.00'),
+      'size_service_type': 'LT',
+      'size_construction': 'R',
+    })
+    self.assertEqual(parse_tire_size('31x10.50', '', 'R15')['size_width'], Decimal('31.00'))
+    self.assertEqual(parse_tire_size('', 'n/a', 'ZR18'), {
+      'size_width': None,
+      'size_aspect_ratio': None,
+      'size_rim_diameter': Decimal('18.00'),
+      'size_service_type': '',
+      'size_construction': 'ZR',
+    })
+
+  def test_quick_search_lookups(self):
+    expected = {'size_width': 215, 'size_aspect_ratio': 55, 'size_rim_diameter': 17}
+    for query in ('215/55R17', '215 55 17', '2155517'):
+      self.assertEqual(quick_search_lookups(query), expected, query)
+    self.assertEqual(quick_search_lookups('21555'), {'size_width': 215, 'size_aspect_ratio': 55})
+    self.assertEqual(quick_search_lookups('22'), {'size_width__gte': 220, 'size_width__lt': 230})
+    self.assertEqual(quick_search_lookups('LT265/70R17')['size_service_type'], 'LT')
+    self.assertEqual(quick_search_lookups(''), {})
+
+  def test_size_lookups(self):
+    self.assertEqual(size_lookups('215', '', '17'), {'size_width': Decimal('215.00'), 'size_rim_diameter': Decimal('17.00')})
+    self.assertEqual(size_lookups('wide', '', ''), {'width__icontains': 'wide'})
+
+  def test_equivalent_sizes(self):
+    self.assertEqual(overall_diameter(Decimal('215'), Decimal('55'), Decimal('17')), Decimal('26.31'))
+    self.assertEqual(overall_diameter(Decimal('31'), Decimal('10.50'), Decimal('15')), Decimal('31'))
+    self.assertIsNone(equivalent_lookups('215/55'))
+    lookups = equivalent_lookups('215/55R17', Decimal('0.03'))
+    self.assertEqual(lookups, {'size_overall_diameter__gte': Decimal('25.52'), 'size_overall_diameter__lte': Decimal('27.10')})
+    self.assertEqual(parse_tolerance('5'), Decimal('0.05'))
+    self.assertEqual(parse_tolerance('50'), Decimal('0.03'))
+    self.assertEqual(parse_tolerance('abc'), Decimal('0.03'))
+
+class EquivalentSizeTests(TestCase):
+  # The overall diameter is stored on save, the equivalents are found with a range on it
+  def test_equivalent_tires(self):
+    same = create_tire(width='215', aspect_ratio='55', rim_size='R17') # 26.31"
+    plus_size = create_tire(width='225', aspect_ratio='45', rim_size='R18') # 25.97"
+    create_tire(width='195', aspect_ratio='65', rim_size='R15') # 24.98"
+    self.assertEqual(same.size_overall_diameter, Decimal('26.31'))
+    self.assertEqual(set(Tire.objects.filter(**equivalent_lookups('215/55R17'))), {same, plus_size})
@@ -17,6 +17,11 @@ urlpatterns = [
 
   path('tires/', views.tire_list, name='tire_list'), # Tire search page
   path('tires/<int:tire_id>', views.tire_detail, name='tire_detail'),
+  path('tires/search/', views.tire_search, name='tire_search'), # Ranked search (JSON)
+  path('tires/sizes/', views.size_suggestions, name='size_suggestions'), # Quick search typeahead (JSON)
+
+  path('api/v1/tires/', views.catalog_api, name='catalog_api'), # Read-only catalog of the current tires (JSON)
+  path('api/v1/price-list/', views.price_list, name='price_list'), # Price list download (CSV or NDJSON), full or since a date
 
   path('add-to-cart/', views.add_to_cart, name='add_to_cart'), # Add tire to cart
 
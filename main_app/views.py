@@ -4,32 +4,38 @@ from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import send_mail, mail_admins, EmailMultiAlternatives
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.db.models import Q
+from django.db.models import F, Q, Prefetch
 from django.forms import formset_factory, modelformset_factory
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
-from django.template import loader
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET
 from django.views.generic import ListView
-from email.mime.image import MIMEImage
 from main_app.forms import CartDetailCreationForm
-from .models import Tire, Cart, CartDetail, OrderShipping
-import re, os, json
+from .models import Tire, Cart, CartDetail, OrderShipping, ProductInventory, AdminNotification
+from .managers import attach_relevant_tires
+from .sizes import equivalent_lookups, parse_tolerance, quick_search_lookups, size_lookups
+from .search import search_terms
+from .catalog import get_catalog_generation, get_catalog_index
+from .pagination import SORT_FIELDS, KeysetPaginator, SequenceKeysetPaginator
+from .facets import search_facets
+from .result_cache import cached_tire_page
+from .feeds import csv_lines, ndjson_lines, price_list_rows
+from .outbox import queue_mail
+from .notifications import notify_admins
+from .emails import order_context, render_invoice_email, render_order_email
+import json, hashlib, datetime
 from users.forms import CustomUserCreationForm, CustomUserChangeForm
 from users.models import CustomUser
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 
+# The cart badge of the pages comes from the cart_badge context processor (see context_processors.py)
 def home(req):
-  user_authenticated = req.user.is_authenticated
-  if (user_authenticated):
-    if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-      cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-    else: 
-      cart = None
-    return render(req, 'home.html', {'cart': cart})
-  else:
-    return render(req, 'home.html')
+  return render(req, 'home.html')
 
 
 def signup(req):
@@ -43,18 +49,17 @@ def signup(req):
       email = user.email
       subject = f"Thank you for registering for a Roadstar Tire Wholesale account"
       message = f"Hello {user.full_name} – Thank you for registering {user.company_name} for an account with us. Your account will need to be verified before you can log in and place an order. Please allow us 24 business hours to do so. If this is urgent, please contact us at (905) 660-3209."
-      send_mail(
+      queue_mail(
         subject, 
         message, 
-        'settings.EMAIL_HOST_USER', 
         [email], 
-        fail_silently=False
       )
-      # Send email to admin
-      mail_admins(
+      # Notify the admins (in the next digest, see notifications.py)
+      notify_admins(
+        AdminNotification.Event.SIGNUP,
         f"New user: {user.full_name} from {user.company_name}",
-        f"{user.full_name} from {user.company_name}, {user.email} – needs to be verified. Please log in to your admin account and verify this new user.\nhttps://www.roadstartirewholesale.ca/admin/users/customuser/{user.id}/change/",
-        fail_silently=False
+        f"{user.full_name} from {user.company_name}, {user.email} – needs to be verified. Please log in to your admin account and verify this new user.",
+        link=reverse('admin:users_customuser_change', args=[user.id]),
       )
       return redirect('confirmation')
   else:
@@ -85,23 +90,17 @@ def logout(req):
 
 @login_required(login_url='/login')
 def account(req):
-  if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-    cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-  else: 
-    cart = None
   user = req.user
   orders = OrderShipping.objects.filter(cart__user_id=req.user.id).exclude(Q(cart__status=Cart.Status.ABANDONED) | Q(cart__status=Cart.Status.CURRENT)).order_by('-cart__ordered_at')
+  orders = orders.select_related('cart').prefetch_related(Prefetch('cart__cartdetail_set', queryset=CartDetail.objects.with_relevant_tire_id()))
   paginator = Paginator(orders, 10, 3) # x objects per page and y number of orphans
   page_number = req.GET.get('page')
   page_obj = paginator.get_page(page_number)
-  return render(req, 'account.html', {'cart': cart, 'user': user, 'orders': orders, 'page_obj': page_obj}) 
+  attach_relevant_tires(cart_detail for order in page_obj for cart_detail in order.cart.cartdetail_set.all()) # Resolve the Tire versions of every order on the page at once
+  return render(req, 'account.html', {'user': user, 'orders': orders, 'page_obj': page_obj}) 
 
 @login_required(login_url='/login')
 def custom_user_edit(req):
-  if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-    cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-  else: 
-    cart = None
   user = req.user
   form = CustomUserChangeForm(instance=user) #initiates form with user info
   if req.method == 'POST': # will only show validation errors on POST, not GET
@@ -114,34 +113,25 @@ def custom_user_edit(req):
       email = req.user.email
       subject = f"Request to update your Roadstar Tire Wholesale profile received"
       message = f"Hello {user.full_name} – This is an email confirmation to inform you that a request was made to edit your Roadstar Tire Wholesale profile details. Your account will be temporarily inactve until a staff member verifies the changes.\nIf this is an error or is urgent, please call (905)-660-3209."
-      send_mail(
+      queue_mail(
         subject, 
         message, 
-        'settings.EMAIL_HOST_USER', 
         [email], 
-        fail_silently=False
       )
-      # Send email to admin
+      # Notify the admins (in the next digest, see notifications.py)
       subject = f"{user.full_name} from {user.company_name} edited their profile"
-      message = f"{user.full_name} from {user.company_name} edited their profile. Please log in to your admin account and verify their account.\nhttps://www.roadstartirewholesale.ca/admin/users/customuser/{user.id}/change/"
-      mail_admins(
+      message = f"{user.full_name} from {user.company_name} edited their profile. Please log in to your admin account and verify their account."
+      notify_admins(
+        AdminNotification.Event.PROFILE_EDIT,
         subject, 
         message, 
-        fail_silently=False
+        link=reverse('admin:users_customuser_change', args=[user.id]),
       )
       return redirect('account')
-  return render(req, 'custom_user_edit_form.html', {'form': form, 'cart': cart})
+  return render(req, 'custom_user_edit_form.html', {'form': form})
 
 def contact(req):
-  user_authenticated = req.user.is_authenticated
-  if (user_authenticated):
-    if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-      cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-    else: 
-      cart = None
-    return render(req, 'contact.html', {'cart': cart})
-  else:
-    return render(req, 'contact.html')
+  return render(req, 'contact.html')
 
 def services(req):
   return render(req, 'services.html')
@@ -160,42 +150,32 @@ def cart_detail(req):
     formset.save()
     return redirect('cart_detail')
   formset = TireFormSet(queryset=cart_details)
-  zipped_data = zip(cart_details, formset)
+  zipped_data = zip(attach_relevant_tires(cart_details.with_relevant_tire_id()), formset)
   return render(req, 'cart.html', {'cart': cart, 'zipped_data': zipped_data, 'formset': formset})
 
 @login_required(login_url='/login')
 def cart_order(req, cart_id):
   cart = Cart.objects.get(id=cart_id)
   cart.status = Cart.Status.IN_PROGRESS
-  cart_details = cart.cartdetail_set.all()
   cart.save()
+  cart_details = attach_relevant_tires(cart.cartdetail_set.with_relevant_tire_id())
   # Send email to user
   email = req.user.email
-  subject = f"Roadstar Tire Wholesale Order # {cart.ordershipping.id} Summary"
-  message = f"Thank you for your business. Your order will be reviewed and shipped shortly. Here is a summary of your order below:"
-  html_message = loader.render_to_string(
-    'email/order_email.html',
-    {
-      'user': req.user,
-      'cart': cart,
-      'cart_details': cart_details
-    }
-  )
-  send_mail(
+  subject, message, html_message = render_order_email(req.user, cart, cart_details)
+  queue_mail(
     subject, 
     message, 
-    'settings.EMAIL_HOST_USER', 
     [email], 
-    fail_silently=False,
     html_message=html_message
   )
-  # Send email to admin
+  # Notify the admins (in the next digest, see notifications.py)
   subject = f"{req.user.full_name} from {req.user.company_name} placed Order #{cart.ordershipping.id}"
-  message = f"{req.user.full_name} from {req.user.company_name}, {req.user.email} – placed an order. Please log in to your admin account to view the details.\nhttps://www.roadstartirewholesale.ca/admin/main_app/cart/{cart.id}/change/"
-  mail_admins(
+  message = f"{req.user.full_name} from {req.user.company_name}, {req.user.email} – placed an order. Please log in to your admin account to view the details."
+  notify_admins(
+    AdminNotification.Event.ORDER_PLACED,
     subject, 
     message, 
-    fail_silently=False
+    link=reverse('admin:main_app_cart_change', args=[cart.id]),
   )
   return redirect('order_detail', cart.ordershipping.pk)
 
@@ -205,13 +185,9 @@ def remove_tire(req, item_id):
 
 @login_required(login_url='/login')
 def order_detail(req, order_id):
-  if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-    cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-  else:
-    cart = None
   order = OrderShipping.objects.get(id=order_id)
-  cart_details = order.cart.cartdetail_set.all()
-  return render(req, 'order_detail.html', {'cart': cart, 'order': order, 'cart_details': cart_details })
+  cart_details = attach_relevant_tires(order.cart.cartdetail_set.with_relevant_tire_id())
+  return render(req, 'order_detail.html', {'order': order, 'cart_details': cart_details })
 
 def order_cancel(req, order_id):
   order = OrderShipping.objects.get(pk=order_id)
@@ -221,91 +197,73 @@ def order_cancel(req, order_id):
   email = req.user.email
   subject = f"Roadstar Tire Wholesale Order # {order.pk} was successfully cancelled"
   message = f"This is an email confirmation to inform you that your Roadstar Tire Wholesale Order # {order.pk} was sucessfully cancelled."
-  send_mail(
+  queue_mail(
     subject, 
     message, 
-    'settings.EMAIL_HOST_USER', 
     [email], 
-    fail_silently=False
   )
-  # Send email to admin
+  # Notify the admins (urgent by default, sent right away, see notifications.py)
   user = req.user
   subject = f"{user.company_name} cancelled Order #{order.id}"
-  message = f"{user.full_name} from {user.company_name}, {user.email} – cancelled Order # {order.id}. Please log in to your admin account to view the details.\n(https://www.roadstartirewholesale.ca/admin/main_app/cart/{order.cart.id}/change/)"
-  mail_admins(
+  message = f"{user.full_name} from {user.company_name}, {user.email} – cancelled Order # {order.id}. Please log in to your admin account to view the details."
+  notify_admins(
+    AdminNotification.Event.ORDER_CANCELLED,
     subject, 
     message, 
-    fail_silently=False
+    link=reverse('admin:main_app_cart_change', args=[order.cart.id]),
   )
   return redirect('order_detail', order.pk)
 
-# NOTE: Uses a different email method so that images can be attached
 def email_invoice(req, order_id):
-  order = OrderShipping.objects.get(id=order_id)
-  cart_details = order.cart.cartdetail_set.all()
   # Send email to user
   email = req.user.email
-  subject = f"Roadstar Tire Wholesale Order # {order.id} was shipped"
-  message = f"Your order has been shipped and an invoice will be provided on delivery. Please log into your account to view details."
-  html_message = loader.render_to_string(
-    'email/invoice_email.html',
-    { 'order': order,
-      'user': req.user,
-      'cart_details': cart_details
-    }
-  )
-  msg = EmailMultiAlternatives(
+  subject, message, html_message = render_invoice_email(order_context(order_id, req.user))
+  queue_mail(
     subject, 
     message, 
-    'settings.EMAIL_HOST_USER', 
-    [email]
+    [email], 
+    html_message=html_message,
+    attach_logo=True # Shown by the invoice
   )
-  msg.attach_alternative(html_message, "text/html")
-  msg.mixed_subtype = 'related'
-  f = 'static/images/road-star-logo.png'
-  fp = open(os.path.join(os.path.dirname(__file__), f), 'rb')
-  msg_img = MIMEImage(fp.read())
-  fp.close()
-  msg_img.add_header('Content-ID', '<{}>'.format(f))
-  msg.attach(msg_img)
-  msg.send()
   return redirect('account')
 
+# Filters and sorts the search with the in-process catalog index (see catalog.py), so that only the tires of the page are fetched
+# Searches the index can't answer (eg. a width that isn't a number) are paged through the ORM queryset (results) instead
+# Pages are requested with the opaque cursor of the previous/next link (see pagination.py)
+def paginate_tires(req, results, lookups, terms=None, sort=''):
+  sort = sort if sort.lstrip('-') in SORT_FIELDS else 'price'
+  cursor = req.GET.get('cursor')
+  # Tires retired since the page was computed are left out of it (the page has less than 20 tires until the next generation)
+  fetch = lambda page_ids: Tire.objects.with_inventory().filter(updated_to=None).select_related('tread', 'product__current_tire').in_bulk(page_ids)
+
+  def paginate(index):
+    ids = index.search(lookups, terms, sort)
+    if ids is None:
+      paginator = KeysetPaginator(results, sort, 20)
+    else:
+      paginator = SequenceKeysetPaginator(index.sort_keys(ids, sort), sort, fetch, 20)
+    return paginator, paginator.get_page(cursor)
+
+  # Pages are cached per catalog generation (see result_cache.py)
+  return cached_tire_page(lookups, terms, sort, cursor, paginate, fetch)
+
 @login_required(login_url='/login')
 def tire_list(req):
-  
-  if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-    cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-  else: 
-    cart = None
-
   sort = None
 
   if 'quick_search' in req.GET:
-    if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-      cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-    else: 
-      cart = None
-
     quick_search = req.GET['quick_search']
-    cleaned_query = re.sub('\D', '', quick_search)
-    width = cleaned_query[:3]
-    aspect_ratio = cleaned_query[3:5]
-    rim_size = cleaned_query[-2:]
-    result = Tire.objects.filter(
+    # Exact/range lookups on the parsed size columns (covered by the tire_current_size_idx index)
+    result = Tire.objects.with_inventory().filter(
         updated_to=None
       ).filter(
-        width__icontains=width
-      ).filter(
-        aspect_ratio__icontains=aspect_ratio
-      ).filter(
-        rim_size__icontains=rim_size
+        **quick_search_lookups(quick_search)
       )
 
     sort = req.GET.get('sort', '')
 
     if not quick_search:
-      results = Tire.objects.filter(updated_to=None).order_by('price')
+      results = Tire.objects.with_inventory().filter(updated_to=None).order_by('price')
       if sort:
         results = result.filter(updated_to=None).order_by(sort)
     else:
@@ -313,39 +271,30 @@ def tire_list(req):
       if sort:
         results = result.filter(updated_to=None).order_by(sort)
 
-    paginator = Paginator(results, 20) # x objects per page and y number of orphans
-    page_number = req.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return render(req, 'tire_list.html', {'sort': sort, 'cart': cart, 'results' : results, 'page_obj' : page_obj})
+    paginator, page_obj = paginate_tires(req, results, quick_search_lookups(quick_search), sort=sort)
+    facets = search_facets(quick_search_lookups(quick_search))
+    equivalent = quick_search if equivalent_lookups(quick_search) is not None else None # Offers the alternative sizes
+    return render(req, 'tire_list.html', {'sort': sort, 'results' : results, 'page_obj' : page_obj, 'paginator': paginator, 'facets': facets, 'equivalent': equivalent})
 
   if 'width' in req.GET:
-    if (Cart.objects.filter(user=req.user, status=Cart.Status.CURRENT)).exists():
-      cart = Cart.objects.get(user=req.user, status=Cart.Status.CURRENT)
-    else: 
-      cart = None
     width = req.GET['width']
     aspect_ratio = req.GET['aspect_ratio']
     rim_size = req.GET['rim_size']
     brand = req.GET['brand']
     tire_type = req.GET['tire_type']
-    result = Tire.objects.filter(
+    result = Tire.objects.with_inventory().filter(
         updated_to=None
       ).filter(
-        width__icontains=width
-      ).filter(
-        aspect_ratio__icontains=aspect_ratio
-      ).filter(
-        rim_size__icontains=rim_size
-      ).filter(
-        brand__icontains=brand
-      ).filter(
-        tire_type__icontains=tire_type
+        **size_lookups(width, aspect_ratio, rim_size)
       )
+    terms = search_terms(brand=brand, tire_type=tire_type)
+    if terms:
+      result = result.search(**terms) # Typo-tolerant, each input on its own field (see search.py)
 
     sort = req.GET.get('sort', '')
 
     if not (width or aspect_ratio or tire_type or brand or rim_size):
-      results = Tire.objects.filter(updated_to=None).order_by('price')
+      results = Tire.objects.with_inventory().filter(updated_to=None).order_by('price')
       if sort:
         results = result.order_by(sort)
     else:
@@ -353,12 +302,138 @@ def tire_list(req):
       if sort:
         results = result.order_by(sort)
 
-    paginator = Paginator(results, 20) # x objects per page and y number of orphans
-    page_number = req.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator, page_obj = paginate_tires(req, results, size_lookups(width, aspect_ratio, rim_size), terms, sort)
+    facets = search_facets(size_lookups(width, aspect_ratio, rim_size), terms)
 
-    return render(req, 'tire_list.html', {'sort': sort, 'cart' : cart, 'results' : results, 'page_obj' : page_obj, 'paginator': paginator})
-  return render(req, 'tire_list.html', {'cart': cart})
+    return render(req, 'tire_list.html', {'sort': sort, 'results' : results, 'page_obj' : page_obj, 'paginator': paginator, 'facets': facets})
+
+  # Alternative sizes, within a tolerance of the overall diameter of the requested size (see sizes.equivalent_lookups)
+  if 'equivalent' in req.GET:
+    equivalent = req.GET['equivalent']
+    tolerance = parse_tolerance(req.GET.get('tolerance'))
+    lookups = equivalent_lookups(equivalent, tolerance)
+    sort = req.GET.get('sort', '')
+
+    if lookups is None: # Not a complete size (eg. '215/55')
+      results = Tire.objects.none()
+      paginator = KeysetPaginator(results, 'price', 20)
+      page_obj = paginator.get_page()
+      facets = []
+    else:
+      # Range scan on size_overall_diameter (covered by the tire_current_diameter_idx index)
+      results = Tire.objects.with_inventory().filter(updated_to=None).filter(**lookups).order_by('price')
+      paginator, page_obj = paginate_tires(req, results, lookups, sort=sort)
+      facets = search_facets(lookups)
+
+    return render(req, 'tire_list.html', {'sort': sort, 'results' : results, 'page_obj' : page_obj, 'paginator': paginator, 'facets': facets, 'equivalent': equivalent, 'tolerance': tolerance * 100})
+  return render(req, 'tire_list.html')
+
+# Sizes of the catalog starting with what was typed in the quick search box (see catalog.py and tire_list.js)
+@login_required(login_url='/login')
+def size_suggestions(req):
+  query = req.GET.get('q', '')
+  sizes = get_catalog_index().suggest_sizes(query)
+  return JsonResponse({'query': query, 'sizes': [{'size': size, 'count': count} for size, count in sizes]})
+
+# Ranked, typo-tolerant search over the current Tire versions (brand, pattern, type, load/speed and tread)
+@login_required(login_url='/login')
+def tire_search(req):
+  query = req.GET.get('q', '')
+  tires = Tire.objects.filter(updated_to=None).search(query).select_related('tread').order_by('-search_rank', 'price')[:20]
+  results = [{
+    'id': tire.id,
+    'name': tire.name,
+    'tire_type': tire.tire_type,
+    'tread': tire.tread.name if tire.tread else '',
+    'price': str(tire.relevant_price),
+    'rank': round(tire.search_rank, 3),
+    'url': tire.get_absolute_url(),
+  } for tire in tires]
+  return JsonResponse({'query': query, 'results': results})
+
+CATALOG_API_PAGE_SIZE = 200
+
+# Changes with the catalog generation (any change to the tires or the stock, see catalog.py) and the query
+# A version coming into effect bumps the generation too, once promoted to Product.current_tire (see promote_tires)
+def catalog_api_etag(req):
+  return f'v1-{get_catalog_generation()}-{hashlib.md5(req.GET.urlencode().encode()).hexdigest()}'
+
+# Read-only catalog of the Tire versions in effect (Product.current_tire, upcoming prices aren't listed), filtered like the
+# detailed search and paged by id (?after=<id>)
+# Polls sending the ETag back (If-None-Match) get a 304 without querying the tires until the catalog changes
+@login_required(login_url='/login')
+@require_GET
+@gzip_page
+@cache_control(private=True, must_revalidate=True)
+@condition(etag_func=catalog_api_etag)
+def catalog_api(req):
+  width = req.GET.get('width', '')
+  aspect_ratio = req.GET.get('aspect_ratio', '')
+  rim_size = req.GET.get('rim_size', '')
+  brand = req.GET.get('brand', '')
+  tire_type = req.GET.get('tire_type', '')
+  tires = Tire.objects.with_inventory().filter(product__current_tire=F('pk')).filter(**size_lookups(width, aspect_ratio, rim_size))
+  terms = search_terms(brand=brand, tire_type=tire_type)
+  if terms:
+    tires = tires.search(**terms) # Typo-tolerant, each input on its own field (see search.py)
+  after = req.GET.get('after', '')
+  if after.isdigit():
+    tires = tires.filter(pk__gt=int(after))
+  tires = list(tires.order_by('pk')[:CATALOG_API_PAGE_SIZE + 1])
+  has_next = len(tires) > CATALOG_API_PAGE_SIZE
+  tires = tires[:CATALOG_API_PAGE_SIZE]
+
+  results = [{
+    'id': tire.id,
+    'product_id': tire.product_id,
+    'size': tire.size,
+    'width': tire.width,
+    'aspect_ratio': tire.aspect_ratio,
+    'rim_size': tire.rim_size,
+    'brand': tire.brand,
+    'pattern': tire.pattern,
+    'load_speed': tire.load_speed,
+    'tire_type': tire.tire_type,
+    'price': str(tire.relevant_price),
+    'stock': ProductInventory.get_stock_band(tire.inventory_current_quantity),
+    'url': req.build_absolute_uri(tire.get_absolute_url()),
+  } for tire in tires]
+  next_url = None
+  if has_next:
+    query = req.GET.copy()
+    query['after'] = tires[-1].pk
+    next_url = req.build_absolute_uri(f'{req.path}?{query.urlencode()}')
+  return JsonResponse({'version': 1, 'results': results, 'next': next_url})
+
+# Price list of every tire in effect, streamed as CSV (default) or NDJSON (?format=ndjson), see feeds.py
+# ?since=<ISO 8601 timestamp> only lists the changes since then, clients pass the X-Generated-At of their previous download
+# A date alone (eg. ?since=2020-10-01) means midnight in the timezone of the user, like a timestamp without an offset
+@login_required(login_url='/login')
+@require_GET
+def price_list(req):
+  now = timezone.now()
+  since = None
+  if req.GET.get('since'):
+    try:
+      since = parse_datetime(req.GET['since'])
+      if since is None and parse_date(req.GET['since']):
+        since = datetime.datetime.combine(parse_date(req.GET['since']), datetime.time.min)
+    except ValueError: # Well formatted but invalid, eg. 2020-13-01
+      since = None
+    if since is None:
+      return HttpResponseBadRequest('since must be an ISO 8601 timestamp or date (eg. 2020-10-01T08:00:00Z or 2020-10-01)')
+    if timezone.is_naive(since):
+      since = timezone.make_aware(since)
+  rows = price_list_rows(now, since)
+  if req.GET.get('format') == 'ndjson':
+    response = StreamingHttpResponse(ndjson_lines(rows), content_type='application/x-ndjson')
+    extension = 'ndjson'
+  else:
+    response = StreamingHttpResponse(csv_lines(rows), content_type='text/csv')
+    extension = 'csv'
+  response['Content-Disposition'] = f'attachment; filename="price-list-{now:%Y%m%d%H%M%S}.{extension}"'
+  response['X-Generated-At'] = now.isoformat()
+  return response
 
 def tire_detail(req, tire_id):
   # Grab a reference to the current cart, and if it doesn't exist, then create one
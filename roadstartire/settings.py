@@ -117,6 +117,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main_app.context_processors.cart_badge',
             ],
         },
     },
@@ -136,6 +137,22 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# 'default' is local to each worker, 'shared' is seen by every worker (search results and facets of each catalog generation,
+# see main_app/catalog.py). The shared cache table is created by `manage.py createcachetable` (see Procfile)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'roadstar_cache',
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -158,8 +175,11 @@ email_key = os.environ['EMAIL']
 password_key = os.environ['PASSWORD']
 
 #required to send email
-# EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Emails are queued in the outbox and sent by the send_outbox_emails worker (see main_app/outbox.py)
+# To deliver them locally, set EMAIL_BACKEND to django.core.mail.backends.console.EmailBackend, or to
+# django.core.mail.backends.filebased.EmailBackend to write them to EMAIL_FILE_PATH
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
 EMAIL_USE_TLS = True
 # EMAIL_USE_SSL = False
 EMAIL_HOST = 'smtp.gmail.com'
@@ -168,6 +188,11 @@ EMAIL_HOST_PASSWORD = password_key
 EMAIL_PORT = 587
 ADMINS = [('Mohsen', email_key)]
 
+# Signups, profile edits and orders are sent to the ADMINS in a single digest email every ADMIN_DIGEST_WINDOW seconds,
+# except the ADMIN_URGENT_EVENTS (comma-separated), sent right away (see main_app/notifications.py)
+ADMIN_DIGEST_WINDOW = int(os.environ.get('ADMIN_DIGEST_WINDOW', 15 * 60))
+ADMIN_URGENT_EVENTS = [event for event in os.environ.get('ADMIN_URGENT_EVENTS', 'order_cancelled').split(',') if event]
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
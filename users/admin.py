@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin
 from main_app.models import Cart
+from main_app.outbox import OutboxBatchAdminMixin
 from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.db import IntegrityError
@@ -25,7 +26,8 @@ class CartInline(admin.TabularInline):
 
   show_change_link = True
 
-class CustomUserAdmin(UserAdmin):
+# Verifying users in bulk (is_active is list_editable) sends their verification emails together (see OutboxBatchAdminMixin)
+class CustomUserAdmin(OutboxBatchAdminMixin, UserAdmin):
   add_form = CustomUserCreationForm
   form = CustomUserChangeForm
   model = CustomUser
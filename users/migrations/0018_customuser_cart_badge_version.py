@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_auto_20201009_1601'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='cart_badge_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -99,6 +99,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     help_text=tax_percent_help_text
   )
   timezone = TimeZoneField(default='America/Toronto')
+  # Incremented whenever the user's carts change, the cart badge of the pages is cached per version (see main_app/context_processors.py)
+  cart_badge_version = models.PositiveIntegerField(default=0, editable=False)
 
   # is_active_status_tracker = FieldTracker(fields=['is_active'])
   tax_percent_tracker = FieldTracker(fields=['tax_percent'])
@@ -134,4 +136,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
       currentCart.save()
     except Cart.DoesNotExist:
       currentCart = None
+    # cart_badge_version is only incremented in the database (including by the currentCart.save() above), don't write back the loaded value
+    if not self._state.adding and kwargs.get('update_fields') is None:
+      kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != 'cart_badge_version']
     super(CustomUser, self).save(*args, **kwargs)
\ No newline at end of file